@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import asyncio
 import uuid
 import logging
 
 from src.core.security import tenant_scoped, current_tenant
-from src.core.firestore_wrapper import TenantFirestore
+from src.core.firestore_wrapper import AsyncTenantFirestore
 from src.core.queue import JobQueue
+from src.core.storage import ContractStore
 
 logger = logging.getLogger(__name__)
 
+# No custom default_response_class: with a response_model set, FastAPI serializes the
+# response straight to JSON bytes in pydantic-core, skipping jsonable_encoder + json.dumps.
+# A custom class such as ORJSONResponse would disable that fast path.
 router = APIRouter()
 
 class AnalyzeRequest(BaseModel):
@@ -19,21 +24,32 @@ class AnalyzeResponse(BaseModel):
     job_id: str
     status: str
 
-# Dependency to get Firestore
-def get_db():
-    return TenantFirestore()
+# Dependency to get Firestore (shared client created in lifespan)
+def get_db(request: Request) -> AsyncTenantFirestore:
+    db = getattr(request.app.state, "db", None)
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return db
 
-# Dependency to get Queue
-def get_queue():
-    return JobQueue()
+# Dependency to get Queue (shared client created in lifespan)
+def get_queue(request: Request) -> JobQueue:
+    queue = getattr(request.app.state, "queue", None)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Queue unavailable")
+    return queue
+
+# Dependency to get the contract store (None when no bucket is configured)
+def get_contract_store(request: Request) -> Optional[ContractStore]:
+    return getattr(request.app.state, "contract_store", None)
 
 @router.post("/analyze", response_model=AnalyzeResponse, status_code=status.HTTP_202_ACCEPTED)
 @tenant_scoped
 async def analyze_contract(
     request: AnalyzeRequest,
     req: Request,  # Added Request object for @tenant_scoped decorator
-    db: TenantFirestore = Depends(get_db),
-    queue: JobQueue = Depends(get_queue)
+    db: AsyncTenantFirestore = Depends(get_db),
+    queue: JobQueue = Depends(get_queue),
+    store: Optional[ContractStore] = Depends(get_contract_store)
 ):
     """
     Enqueues a contract analysis job.
@@ -42,35 +58,51 @@ async def analyze_contract(
     if not tenant_id:
         raise HTTPException(status_code=500, detail="Tenant context missing")
 
-    job_id = str(uuid.uuid4())
+    job_id = uuid.uuid4().hex
     
-    # 1. Create Job in Firestore
+    # 1. Store the contract text in Cloud Storage, if configured.
+    # The Firestore doc and the task payload then carry a small gs:// pointer instead of the text.
+    contract_ref = {"contract_text": request.contract_text}
+    if store is not None:
+        try:
+            contract_uri = await asyncio.to_thread(store.upload, tenant_id, job_id, request.contract_text)
+        except Exception as e:
+            logger.error(f"Failed to upload contract text to Cloud Storage: {e}")
+            raise HTTPException(status_code=500, detail="Storage error")
+        contract_ref = {"contract_uri": contract_uri}
+
+    # 2. Create Job in Firestore
     job_ref = db.collection(f"tenants/{tenant_id}/jobs").document(job_id)
     try:
-        job_ref.set({
+        await job_ref.set({
             "status": "QUEUED",
             "created_at": "NOW", # Real implementation uses firestore.SERVER_TIMESTAMP
             "input_text_length": len(request.contract_text),
-            # Don't store full text if huge, or store in Cloud Storage. 
-            # For this task, we store text in payload or separate field.
-            # Storing text in Firestore is OK if < 1MB.
-            "contract_text": request.contract_text 
+            # Without a bucket the text is stored inline (OK while < 1MB)
+            **contract_ref
         })
     except Exception as e:
         logger.error(f"Failed to create job in Firestore: {e}")
+        # Don't leave an orphaned contract in Cloud Storage
+        if "contract_uri" in contract_ref:
+            try:
+                await asyncio.to_thread(store.delete, contract_ref["contract_uri"], tenant_id)
+            except Exception as cleanup_error:
+                logger.error(f"Failed to delete orphaned contract {contract_ref['contract_uri']}: {cleanup_error}")
         raise HTTPException(status_code=500, detail="Database error")
 
-    # 2. Enqueue Job
+    # 3. Enqueue Job
     try:
-        queue.enqueue_job(
-            job_id=job_id, 
+        await queue.enqueue_job_async(
+            job_id=job_id,
             tenant_id=tenant_id, 
-            payload={"contract_text": request.contract_text}
+            payload=contract_ref
         )
     except Exception as e:
         # If queue fails, we should probably mark job as FAILED or delete it.
         logger.error(f"Failed to enqueue job: {e}")
-        job_ref.update({"status": "FAILED_QUEUE"})
+        await job_ref.update({"status": "FAILED_QUEUE"})
         raise HTTPException(status_code=500, detail="Queue error")
 
-    return AnalyzeResponse(job_id=job_id, status="queued")
+    # Both fields are server-generated (uuid + constant), so skip constructor validation
+    return AnalyzeResponse.model_construct(job_id=job_id, status="queued")
@@ -1,17 +1,25 @@
+import json
 import logging
-from typing import List, Literal
-from pydantic_settings import BaseSettings
-from pydantic import Field, field_validator # <-- NOTE: field_validator import needed!
+import os
+from functools import cache
+from typing import Annotated, List, Literal, Optional
+from dotenv import dotenv_values
+from pydantic_settings import BaseSettings, NoDecode
+from pydantic import Field, field_validator
 
 logger = logging.getLogger(__name__)
 
+MAX_CORS_ORIGINS = 100
+
+# Parsed once per process; pydantic-settings is not asked to re-read the file.
+_DOTENV_VALUES = dotenv_values(".env")
+
 class Settings(BaseSettings):
-    # ... (existing fields) ...
-    
     # CORS Configuration
-    CORS_ORIGINS: List[str] = Field(
+    # NoDecode: the raw env value is handed to the validator below instead of being JSON-decoded
+    CORS_ORIGINS: Annotated[List[str], NoDecode] = Field(
         default=[], 
-        description="List of allowed CORS origins"
+        description="List of allowed CORS origins (comma-separated or JSON list)"
     )
 
     # Environment & Project Configuration
@@ -19,31 +27,58 @@ class Settings(BaseSettings):
     GCP_PROJECT_ID: str
     FIREBASE_PROJECT_ID: str
     VERTEX_AI_LOCATION: str = "us-central1"
+    # Model for the firewall's LLM check; must support controlled generation (response_schema)
+    VERTEX_AI_MODEL: str = "gemini-2.5-flash"
+
+    # Cloud Storage bucket for contract texts; when unset, texts are stored inline in Firestore
+    CONTRACT_BUCKET: Optional[str] = None
 
-    # --- FIX START: Add a validator to handle the empty string ---
     @field_validator('CORS_ORIGINS', mode='before')
-    def parse_empty_cors_origins(cls, v):
-        if isinstance(v, str) and v.strip() == '':
-            logger.warning("CORS_ORIGINS is empty; defaulting to empty list.")
-            return [] # Convert the empty string to a Python list
-        return v
-    # --- FIX END ---
+    def parse_cors_origins(cls, v):
+        """
+        Normalizes CORS origins once at load time: splits comma-separated values,
+        lowercases, drops trailing slashes and duplicates.
+        """
+        if isinstance(v, str):
+            if v.strip() == '':
+                logger.warning("CORS_ORIGINS is empty; defaulting to empty list.")
+                return [] # Convert the empty string to a Python list
+            v = json.loads(v) if v.lstrip().startswith('[') else v.split(',')
+
+        if not isinstance(v, (list, tuple, set, frozenset)):
+            return v # Let pydantic report the type error
+
+        # dict.fromkeys dedupes while keeping order; Starlette's CORSMiddleware requires a list
+        origins = list(dict.fromkeys(
+            o.strip().rstrip('/').lower() for o in v if isinstance(o, str) and o.strip()
+        ))
+        if len(origins) > MAX_CORS_ORIGINS:
+            raise ValueError(f"CORS_ORIGINS allows at most {MAX_CORS_ORIGINS} origins, got {len(origins)}")
+        return origins
     
     model_config = {
-        "env_file": ".env",
         "case_sensitive": True,
         "extra": "ignore" 
     }
 
-# Validate settings immediately on import
-import os
-try:
-    settings = Settings()
-except Exception as e:
-    logger.critical("Failed to load configuration.")
-    logger.critical(f"Environment keys: {list(os.environ.keys())}")
-    if hasattr(e, "errors"):
-        logger.critical(f"Validation errors: {e.errors()}")
-    else:
-        logger.critical(f"Error details: {e}")
-    raise e
\ No newline at end of file
+@cache
+def get_settings() -> Settings:
+    """
+    Returns the process-wide Settings instance, constructing (and validating) it on first call.
+    Tests can call `get_settings.cache_clear()` to force a reload.
+    """
+    # Real environment variables take precedence over .env entries, as with env_file.
+    dotenv_overrides = {
+        key: value for key, value in _DOTENV_VALUES.items()
+        if value is not None and key not in os.environ
+    }
+    try:
+        return Settings(**dotenv_overrides)
+    except Exception as e:
+        logger.critical("Failed to load configuration.")
+        logger.critical(f"Environment keys: {list(os.environ.keys())}")
+        if hasattr(e, "errors"):
+            logger.critical(f"Validation errors: {e.errors()}")
+        else:
+            logger.critical(f"Error details: {e}")
+        raise e
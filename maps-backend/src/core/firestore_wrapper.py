@@ -1,6 +1,9 @@
 from typing import Any, Optional, List, Union, Tuple
 import logging
+from functools import lru_cache
+from google.api_core import gapic_v1
 from google.cloud.firestore_v1.client import Client
+from google.cloud.firestore_v1.async_client import AsyncClient
 from google.cloud.firestore_v1.collection import CollectionReference
 from google.cloud.firestore_v1.document import DocumentReference
 from google.cloud.firestore_v1.query import Query
@@ -12,28 +15,86 @@ from src.core.security import current_tenant, SecurityBreachError
 
 logger = logging.getLogger(__name__)
 
-def _validate_path(path: str) -> None:
+# The SDK's own default: keep its retry policy unless the caller passes one (None disables retries)
+_DEFAULT_RETRY = gapic_v1.method.DEFAULT
+
+# Segments that could make a path resolve outside the prefix it textually starts with
+_RELATIVE_SEGMENTS = frozenset((".", ".."))
+
+@lru_cache(maxsize=4096)
+def _split(path: str) -> Tuple[str, ...]:
+    """
+    Splits a Firestore path into its segments, memoized for repeatedly validated paths.
+    """
+    return tuple(path.strip("/").split("/"))
+
+def _validate_path(path: str) -> str:
     """
-    Validates that the path starts with 'tenants/{tenant_id}/'.
-    Raises SecurityBreachError if not.
+    Validates that the path is 'tenants/{tenant_id}' or lies below it, comparing whole
+    segments (so 'tenants/tenant-A2' never matches tenant 'tenant-A').
+    Returns the tenant_id it was validated for; raises SecurityBreachError if not.
     """
     tenant_id = current_tenant.get()
     if not tenant_id:
         raise SecurityBreachError("Access denied: No active tenant context.")
     
-    expected_prefix = f"tenants/{tenant_id}/"
-    clean_path = path.strip("/")
-    
-    if clean_path == f"tenants/{tenant_id}":
-        return 
-               
-    if not clean_path.startswith(expected_prefix):
-        msg = f"Security Alert: Attempted access to {clean_path} from tenant {tenant_id}"
+    segments = _split(path)
+    if (
+        len(segments) < 2
+        or segments[0] != "tenants"
+        or segments[1] != tenant_id
+        or not _RELATIVE_SEGMENTS.isdisjoint(segments)
+    ):
+        msg = f"Security Alert: Attempted access to {path.strip('/')} from tenant {tenant_id}"
         logger.error(msg)
         raise SecurityBreachError(msg)
 
+    return tenant_id
+
+def _ref_path(ref) -> str:
+    """
+    Returns the full path of a raw Firestore reference.
+    The SDK's CollectionReference has no `.path` (only the `_path` tuple), and
+    DocumentReference.path re-joins `_path` on every access.
+    """
+    path = getattr(ref, "_path", None)
+    if isinstance(path, tuple):
+        return "/".join(path)
+    return ref.path
+
+def _validate_child_path(parent_tenant_id: Optional[str], parent_ref, child_id: str) -> str:
+    """
+    Validates '{parent path}/{child_id}' and returns the tenant_id, like _validate_path.
+    A parent already validated for the active tenant cannot be escaped by appending a single
+    path segment, so in that case the child path is neither built nor re-validated.
+    """
+    tenant_id = current_tenant.get()
+    if tenant_id and tenant_id == parent_tenant_id and "/" not in child_id and child_id not in _RELATIVE_SEGMENTS:
+        return tenant_id
+    return _validate_path(f"{_ref_path(parent_ref)}/{child_id}")
+
+
+def _unwrap(reference):
+    """
+    Returns the raw Firestore reference behind a tenant wrapper (or a raw reference as-is),
+    after validating its path.
+    Raises SecurityBreachError for references without a path, which cannot be validated.
+    """
+    if isinstance(reference, (TenantDocumentReference, TenantCollectionReference)):
+        reference = reference._ref
+
+    path = getattr(reference, "path", None)
+    if not path:
+        raise SecurityBreachError("Access denied: Cannot validate reference without a path.")
+
+    _validate_path(path)
+    return reference
+
 
 class TenantQuery:
+    # Created on every where/limit/order_by; slots keep these wrappers small and fast to build
+    __slots__ = ("_query",)
+
     def __init__(self, original_query: Query):
         self._query = original_query
 
@@ -69,46 +130,28 @@ class TenantQuery:
 
 
 class TenantWriteBatch:
+    __slots__ = ("_batch",)
+
     def __init__(self, batch: WriteBatch):
         self._batch = batch
 
     def set(self, reference, document_data, merge=False):
-        if hasattr(reference, '_ref'):
-            reference = reference._ref
-        
-        if hasattr(reference, 'path'):
-            _validate_path(reference.path)
-        
+        reference = _unwrap(reference)
         self._batch.set(reference, document_data, merge=merge)
         return self
 
     def create(self, reference, document_data):
-        if hasattr(reference, '_ref'):
-            reference = reference._ref
-        
-        if hasattr(reference, 'path'):
-            _validate_path(reference.path)
-
+        reference = _unwrap(reference)
         self._batch.create(reference, document_data)
         return self
 
     def update(self, reference, field_updates, option=None):
-        if hasattr(reference, '_ref'):
-            reference = reference._ref
-        
-        if hasattr(reference, 'path'):
-            _validate_path(reference.path)
-
+        reference = _unwrap(reference)
         self._batch.update(reference, field_updates, option=option)
         return self
 
     def delete(self, reference, option=None):
-        if hasattr(reference, '_ref'):
-            reference = reference._ref
-        
-        if hasattr(reference, 'path'):
-            _validate_path(reference.path)
-
+        reference = _unwrap(reference)
         self._batch.delete(reference, option=option)
         return self
 
@@ -117,22 +160,26 @@ class TenantWriteBatch:
 
 
 class TenantTransaction(TenantWriteBatch):
+    __slots__ = ("_transaction",)
+
     def __init__(self, transaction: Transaction):
         self._transaction = transaction
         self._batch = transaction 
 
     def get(self, reference):
-        if hasattr(reference, '_ref'):
-            reference = reference._ref
-        else:
-             if hasattr(reference, 'path'):
-                 _validate_path(reference.path)
-        return self._transaction.get(reference)
+        if isinstance(reference, TenantQuery):
+            # Queries can only be built from an already validated collection
+            return self._transaction.get(reference._query)
+        return self._transaction.get(_unwrap(reference))
 
 
 class TenantDocumentReference:
-    def __init__(self, original_ref: DocumentReference):
+    __slots__ = ("_ref", "_tenant_id")
+
+    def __init__(self, original_ref: DocumentReference, tenant_id: Optional[str] = None):
         self._ref = original_ref
+        # Tenant this ref's path was validated for (None: unknown, children are always re-validated)
+        self._tenant_id = tenant_id
 
     @property
     def id(self):
@@ -146,35 +193,42 @@ class TenantDocumentReference:
     def parent(self):
         parent_ref = self._ref.parent
         try:
-            _validate_path(parent_ref.path)
+            tenant_id = _validate_path(_ref_path(parent_ref))
         except SecurityBreachError:
-             msg = f"Traversal attempt denied: Parent {parent_ref.path} is outside tenant scope."
+             msg = f"Traversal attempt denied: Parent {_ref_path(parent_ref)} is outside tenant scope."
              logger.error(msg)
              raise SecurityBreachError(msg)
              
-        return TenantCollectionReference(parent_ref)
+        return self._wrap_collection(parent_ref, tenant_id)
 
     def collection(self, collection_id: str):
-        full_path = f"{self._ref.path}/{collection_id}"
-        _validate_path(full_path)
-        return TenantCollectionReference(self._ref.collection(collection_id))
+        tenant_id = _validate_child_path(self._tenant_id, self._ref, collection_id)
+        return self._wrap_collection(self._ref.collection(collection_id), tenant_id)
+
+    def _wrap_collection(self, ref, tenant_id=None):
+        return TenantCollectionReference(ref, tenant_id)
 
-    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+    # Signatures mirror DocumentReference; writes inside a transaction go through TenantTransaction
+    def get(self, field_paths=None, transaction=None, retry=_DEFAULT_RETRY, timeout=None):
         return self._ref.get(field_paths=field_paths, transaction=transaction, retry=retry, timeout=timeout)
         
-    def set(self, document_data, merge=False, transaction=None):
-        return self._ref.set(document_data, merge=merge, transaction=transaction)
+    def set(self, document_data, merge=False, retry=_DEFAULT_RETRY, timeout=None):
+        return self._ref.set(document_data, merge=merge, retry=retry, timeout=timeout)
         
-    def update(self, field_updates, option=None, transaction=None):
-        return self._ref.update(field_updates, option=option, transaction=transaction)
+    def update(self, field_updates, option=None, retry=_DEFAULT_RETRY, timeout=None):
+        return self._ref.update(field_updates, option=option, retry=retry, timeout=timeout)
         
-    def delete(self, option=None, transaction=None):
-        return self._ref.delete(option=option, transaction=transaction)
+    def delete(self, option=None, retry=_DEFAULT_RETRY, timeout=None):
+        return self._ref.delete(option=option, retry=retry, timeout=timeout)
 
 
 class TenantCollectionReference:
-    def __init__(self, original_ref: CollectionReference):
+    __slots__ = ("_ref", "_tenant_id")
+
+    def __init__(self, original_ref: CollectionReference, tenant_id: Optional[str] = None):
         self._ref = original_ref
+        # Tenant this ref's path was validated for (None: unknown, children are always re-validated)
+        self._tenant_id = tenant_id
 
     @property
     def id(self):
@@ -182,7 +236,7 @@ class TenantCollectionReference:
         
     @property
     def path(self):
-        return self._ref.path
+        return _ref_path(self._ref)
 
     @property
     def parent(self):
@@ -193,23 +247,25 @@ class TenantCollectionReference:
              raise SecurityBreachError(msg)
              
         try:
-            _validate_path(parent_ref.path)
+            tenant_id = _validate_path(_ref_path(parent_ref))
         except SecurityBreachError:
-             msg = f"Traversal attempt denied: Parent {parent_ref.path} is outside tenant scope."
+             msg = f"Traversal attempt denied: Parent {_ref_path(parent_ref)} is outside tenant scope."
              logger.error(msg)
              raise SecurityBreachError(msg)
              
-        return TenantDocumentReference(parent_ref)
+        return self._wrap_document(parent_ref, tenant_id)
 
     def document(self, document_id: Optional[str] = None):
         if document_id:
-            full_path = f"{self._ref.path}/{document_id}"
-            _validate_path(full_path)
-            return TenantDocumentReference(self._ref.document(document_id))
+            tenant_id = _validate_child_path(self._tenant_id, self._ref, document_id)
+            return self._wrap_document(self._ref.document(document_id), tenant_id)
         else:
             doc_ref = self._ref.document()
-            _validate_path(doc_ref.path)
-            return TenantDocumentReference(doc_ref)
+            tenant_id = _validate_child_path(self._tenant_id, self._ref, doc_ref.id)
+            return self._wrap_document(doc_ref, tenant_id)
+
+    def _wrap_document(self, ref, tenant_id=None):
+        return TenantDocumentReference(ref, tenant_id)
 
     # Query methods delegated to TenantQuery
     def where(self, field_path, op_string, value):
@@ -236,21 +292,21 @@ class TenantCollectionReference:
     def end_before(self, document_fields_or_snapshot):
         return TenantQuery(self._ref.end_before(document_fields_or_snapshot))
 
-    def stream(self, transaction=None, retry=None, timeout=None):
+    def stream(self, transaction=None, retry=_DEFAULT_RETRY, timeout=None):
         return self._ref.stream(transaction=transaction, retry=retry, timeout=timeout)
         
-    def get(self, transaction=None, retry=None, timeout=None):
+    def get(self, transaction=None, retry=_DEFAULT_RETRY, timeout=None):
         return self._ref.get(transaction=transaction, retry=retry, timeout=timeout)
         
-    def add(self, document_data, document_id=None, retry=None, timeout=None):
+    def add(self, document_data, document_id=None, retry=_DEFAULT_RETRY, timeout=None):
         if document_id is None:
             doc_ref = self._ref.document() 
         else:
             doc_ref = self._ref.document(document_id)
             
-        _validate_path(doc_ref.path)
+        tenant_id = _validate_child_path(self._tenant_id, self._ref, document_id or doc_ref.id)
         ts = doc_ref.create(document_data, retry=retry, timeout=timeout) 
-        return ts, TenantDocumentReference(doc_ref)
+        return ts, self._wrap_document(doc_ref, tenant_id)
 
 
 class TenantTransactionContextManager:
@@ -273,12 +329,18 @@ class TenantFirestore:
             self._client = Client(project=project, credentials=credentials, database=database)
 
     def collection(self, path: str) -> TenantCollectionReference:
-        _validate_path(path)
-        return TenantCollectionReference(self._client.collection(path))
+        tenant_id = _validate_path(path)
+        return self._wrap_collection(self._client.collection(path), tenant_id)
 
     def document(self, path: str) -> TenantDocumentReference:
-        _validate_path(path)
-        return TenantDocumentReference(self._client.document(path))
+        tenant_id = _validate_path(path)
+        return self._wrap_document(self._client.document(path), tenant_id)
+
+    def _wrap_collection(self, ref, tenant_id=None):
+        return TenantCollectionReference(ref, tenant_id)
+
+    def _wrap_document(self, ref, tenant_id=None):
+        return TenantDocumentReference(ref, tenant_id)
 
     def collection_group(self, collection_id: str):
         msg = "Security Alert: collection_group queries are disabled for strict tenant isolation."
@@ -286,22 +348,7 @@ class TenantFirestore:
         raise SecurityBreachError(msg)
 
     def get_all(self, references: List[Any], field_paths=None, transaction=None, retry=None, timeout=None):
-        unwrapped_refs = []
-        for ref in references:
-            path = getattr(ref, 'path', None)
-            if not path and hasattr(ref, '_ref'): 
-                 path = ref._ref.path
-            
-            if path:
-                _validate_path(path)
-            else:
-                 raise SecurityBreachError("Cannot validate reference in get_all")
-            
-            if hasattr(ref, '_ref'):
-                unwrapped_refs.append(ref._ref)
-            else:
-                unwrapped_refs.append(ref)
-                
+        unwrapped_refs = [_unwrap(ref) for ref in references]
         return self._client.get_all(unwrapped_refs, field_paths=field_paths, transaction=transaction, retry=retry, timeout=timeout)
 
     def batch(self):
@@ -309,3 +356,61 @@ class TenantFirestore:
 
     def transaction(self, **kwargs):
         return TenantTransactionContextManager(self._client.transaction(**kwargs))
+
+
+# --- Async variants (google.cloud.firestore.AsyncClient) ---
+# Path validation is identical; I/O methods return awaitables from the wrapped async refs.
+
+class AsyncTenantDocumentReference(TenantDocumentReference):
+    __slots__ = ()
+
+    def _wrap_collection(self, ref, tenant_id=None):
+        return AsyncTenantCollectionReference(ref, tenant_id)
+
+    # Signatures mirror AsyncDocumentReference (AsyncRetry; no transaction on writes)
+    async def get(self, field_paths=None, transaction=None, retry=_DEFAULT_RETRY, timeout=None):
+        return await self._ref.get(field_paths=field_paths, transaction=transaction, retry=retry, timeout=timeout)
+
+    async def set(self, document_data, merge=False, retry=_DEFAULT_RETRY, timeout=None):
+        return await self._ref.set(document_data, merge=merge, retry=retry, timeout=timeout)
+
+    async def update(self, field_updates, option=None, retry=_DEFAULT_RETRY, timeout=None):
+        return await self._ref.update(field_updates, option=option, retry=retry, timeout=timeout)
+
+    async def delete(self, option=None, retry=_DEFAULT_RETRY, timeout=None):
+        return await self._ref.delete(option=option, retry=retry, timeout=timeout)
+
+
+class AsyncTenantCollectionReference(TenantCollectionReference):
+    __slots__ = ()
+
+    def _wrap_document(self, ref, tenant_id=None):
+        return AsyncTenantDocumentReference(ref, tenant_id)
+
+    async def add(self, document_data, document_id=None, retry=_DEFAULT_RETRY, timeout=None):
+        if document_id is None:
+            doc_ref = self._ref.document() 
+        else:
+            doc_ref = self._ref.document(document_id)
+            
+        tenant_id = _validate_child_path(self._tenant_id, self._ref, document_id or doc_ref.id)
+        ts = await doc_ref.create(document_data, retry=retry, timeout=timeout) 
+        return ts, self._wrap_document(doc_ref, tenant_id)
+
+
+class AsyncTenantFirestore(TenantFirestore):
+    def __init__(self, project=None, credentials=None, database=None, client=None):
+        if client:
+            self._client = client
+        else:
+            self._client = AsyncClient(project=project, credentials=credentials, database=database)
+
+    def _wrap_collection(self, ref, tenant_id=None):
+        return AsyncTenantCollectionReference(ref, tenant_id)
+
+    def _wrap_document(self, ref, tenant_id=None):
+        return AsyncTenantDocumentReference(ref, tenant_id)
+
+    def transaction(self, **kwargs):
+        # AsyncTransaction is driven by @async_transactional rather than a context manager
+        return TenantTransaction(self._client.transaction(**kwargs))
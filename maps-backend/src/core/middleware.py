@@ -13,8 +13,13 @@ class TenantMiddleware(BaseHTTPMiddleware):
     this middleware provides a safety net and logging.
     """
     async def dispatch(self, request: Request, call_next):
-        # Reset context variable to ensure no leakage from previous requests in the same thread/task
-        # In standard asyncio/FastAPI, contextvars are properly managed, but explicit reset or initialization is good practice.
+        # In standard asyncio/FastAPI, contextvars are already isolated per request task,
+        # so the context is normally clean and no extra set/reset is needed.
+        if current_tenant.get() is None:
+            return await call_next(request)
+
+        # A tenant leaked into this context (e.g. from the same thread/task); clear it for the request.
+        logger.warning("Tenant context leaked into a new request; resetting.")
         token = current_tenant.set(None)
         
         try:
@@ -1,12 +1,22 @@
-import json
+import asyncio
+import gzip
 import logging
 import os
+import orjson
 from google.cloud import tasks_v2
 from google.protobuf import timestamp_pb2
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
+_HTTP_POST = tasks_v2.HttpMethod.POST
+
+# Upper bound on concurrent create_task RPCs issued by enqueue_many
+_MAX_ENQUEUE_WORKERS = 32
+
+# Bodies at least this large are gzip-compressed (the worker decodes Content-Encoding: gzip)
+_GZIP_MIN_BYTES = 64 * 1024
+
 class JobQueue:
     def __init__(self, project_id: Optional[str] = None, location: Optional[str] = None, queue_name: Optional[str] = None):
         """
@@ -15,6 +25,15 @@ class JobQueue:
         self.project_id = project_id or os.getenv("GCP_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
         self.location = location or os.getenv("VERTEX_AI_LOCATION", "europe-west2")
         self.queue_name = queue_name or "default"
+
+        # Invariant parts of every task, resolved once rather than per enqueue
+        self._worker_url = f"{os.getenv('SERVICE_URL', 'http://localhost:8080').rstrip('/')}/worker/process"
+        self._headers = {"Content-Type": "application/json"}
+        self._gzip_headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        # This assumes the Cloud Tasks service account has permission to invoke the Cloud Run service.
+        self._oidc_token = {
+            "service_account_email": os.getenv("SERVICE_ACCOUNT_EMAIL", "default-sa@test.iam.gserviceaccount.com")
+        }
         
         try:
             self.client = tasks_v2.CloudTasksClient()
@@ -34,12 +53,8 @@ class JobQueue:
             # In dev/test, we might just log this. In prod, this should raise an error.
             return
 
-        if not service_url:
-            # Fallback to an env var or a default service URL
-            service_url = os.getenv("SERVICE_URL", "http://localhost:8080")
-        
-        # Construct the target URL
-        url = f"{service_url.rstrip('/')}/worker/process"
+        # Construct the target URL (falls back to SERVICE_URL or a default service URL)
+        url = f"{service_url.rstrip('/')}/worker/process" if service_url else self._worker_url
 
         # Construct the payload
         task_payload = {
@@ -48,22 +63,22 @@ class JobQueue:
             "data": payload
         }
         
-        # Convert payload to bytes
-        json_payload = json.dumps(task_payload)
-        payload_bytes = json_payload.encode("utf-8")
+        # Serialize payload straight to bytes; large contract texts compress well
+        payload_bytes = orjson.dumps(task_payload)
+        headers = self._headers
+        if len(payload_bytes) >= _GZIP_MIN_BYTES:
+            payload_bytes = gzip.compress(payload_bytes, compresslevel=1)
+            headers = self._gzip_headers
 
         # Construct the task
         task = {
             "http_request": {
-                "http_method": tasks_v2.HttpMethod.POST,
+                "http_method": _HTTP_POST,
                 "url": url,
-                "headers": {"Content-Type": "application/json"},
+                "headers": headers,
                 "body": payload_bytes,
                 # Add OIDC Token for authentication
-                # This assumes the Cloud Tasks service account has permission to invoke the Cloud Run service.
-                "oidc_token": {
-                    "service_account_email": os.getenv("SERVICE_ACCOUNT_EMAIL", "default-sa@test.iam.gserviceaccount.com")
-                }
+                "oidc_token": self._oidc_token
             }
         }
 
@@ -73,3 +88,33 @@ class JobQueue:
         except Exception as e:
             logger.error(f"Failed to enqueue job {job_id}: {e}")
             raise e
+
+    async def enqueue_job_async(self, job_id: str, tenant_id: str, payload: Dict[str, Any], service_url: Optional[str] = None):
+        """
+        Async variant of `enqueue_job` for request handlers.
+        The create_task RPC runs in a worker thread, so the event loop keeps serving other requests.
+        """
+        await asyncio.to_thread(self.enqueue_job, job_id, tenant_id, payload, service_url)
+
+    async def enqueue_many(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Enqueues several jobs concurrently.
+        Each item holds the keyword arguments of `enqueue_job` (job_id, tenant_id, payload, ...).
+        At most _MAX_ENQUEUE_WORKERS create_task RPCs are in flight at once, so the total
+        latency is roughly one round-trip per batch rather than one per job.
+        Returns the ids of the jobs that failed to enqueue.
+        """
+        if not jobs:
+            return []
+        if not self.client or not self.parent:
+            logger.error("Cloud Tasks Client not initialized. Jobs not enqueued.")
+            return [job["job_id"] for job in jobs]
+
+        semaphore = asyncio.Semaphore(_MAX_ENQUEUE_WORKERS)
+
+        async def enqueue(job: Dict[str, Any]) -> None:
+            async with semaphore:
+                await self.enqueue_job_async(**job)
+
+        results = await asyncio.gather(*(enqueue(job) for job in jobs), return_exceptions=True)
+        return [job["job_id"] for job, result in zip(jobs, results) if isinstance(result, BaseException)]
@@ -1,13 +1,45 @@
+import asyncio
 import contextvars
+import hashlib
+import time
 from functools import wraps
 from typing import Optional, Callable
 from fastapi import Request, HTTPException, status
 import firebase_admin
 from firebase_admin import auth
+from cachetools import TTLCache
 
 # Global context variable for the current tenant
 current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tenant", default=None)
 
+# Verified ID tokens, keyed by sha256(token) so raw tokens are never held in memory.
+# Entries also carry the token's own expiry, which bounds how long a hit stays valid.
+# Only touched from the event loop thread (verification itself runs in a worker thread),
+# so no lock is needed around get/set.
+_TOKEN_CACHE_TTL_SECONDS = 300
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=_TOKEN_CACHE_TTL_SECONDS)
+
+async def _verify_id_token_cached(token: str) -> dict:
+    """
+    Returns the decoded token, verifying it with Firebase only on a cache miss.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    cached = _TOKEN_CACHE.get(key)
+    if cached is not None:
+        decoded_token, expires_at = cached
+        if time.time() < expires_at:
+            return decoded_token
+        _TOKEN_CACHE.pop(key, None)
+
+    # Signature verification is CPU-bound (and may fetch certs), so keep it off the event loop
+    decoded_token = await asyncio.to_thread(auth.verify_id_token, token)
+
+    now = time.time()
+    expires_at = min(now + _TOKEN_CACHE_TTL_SECONDS, decoded_token.get("exp", now))
+    if expires_at > now:
+        _TOKEN_CACHE[key] = (decoded_token, expires_at)
+    return decoded_token
+
 class SecurityBreachError(Exception):
     """Raised when a severe security violation is detected (e.g. cross-tenant access attempt)."""
     pass
@@ -20,18 +52,13 @@ def tenant_scoped(func: Callable):
     """
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        # Inspect args/kwargs to find the Request object
-        request: Optional[Request] = None
-        for arg in args:
-            if isinstance(arg, Request):
-                request = arg
-                break
-        if not request:
-            # Also check kwargs
-            for key, value in kwargs.items():
-                if isinstance(value, Request):
-                    request = value
-                    break
+        # FastAPI passes endpoint parameters as kwargs, so look up the conventional names first
+        request: Optional[Request] = kwargs.get("req")
+        if not isinstance(request, Request):
+            request = kwargs.get("request")
+            if not isinstance(request, Request):
+                # Fall back to scanning args/kwargs for a Request under any other name
+                request = next((value for value in (*args, *kwargs.values()) if isinstance(value, Request)), None)
         
         if not request:
              raise HTTPException(status_code=500, detail="Request object not found in arguments. Ensure 'request: Request' is a parameter.")
@@ -45,7 +72,7 @@ def tenant_scoped(func: Callable):
 
         try:
             # Verify the token
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = await _verify_id_token_cached(token)
             tenant_id = decoded_token.get("tenant_id")
 
             if not tenant_id:
@@ -1,9 +1,22 @@
 import re
 import logging
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
 from typing import List, Optional, Literal
 from pydantic import BaseModel
+import orjson
 import vertexai
-from vertexai.generative_models import GenerativeModel, SafetySetting, HarmCategory, HarmBlockThreshold
+from src.core.config import get_settings
+from vertexai.generative_models import GenerativeModel, GenerationConfig, SafetySetting, HarmCategory, HarmBlockThreshold
+
+# Optional Hyperscan acceleration for the regex fast path
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,6 +29,96 @@ class SecurityScanResult(BaseModel):
     threat_type: Literal["NONE", "INJECTION", "HIDDEN_TEXT", "JAILBREAK", "ANOMALY"]
     reasoning: Optional[str] = None
 
+class _ScanResultCache:
+    """
+    Thread-safe LRU cache of scan results keyed by a hash of the scanned text.
+    Shared by all firewall instances so identical payloads (e.g. Cloud Tasks retries)
+    are only scanned once per process.
+    """
+    def __init__(self, maxsize: int = 2048):
+        self._maxsize = maxsize
+        self._entries: "OrderedDict[str, SecurityScanResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[SecurityScanResult]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: SecurityScanResult) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_SCAN_CACHE = _ScanResultCache()
+
+
+# Python's IGNORECASE folds these non-ASCII code points onto ASCII letters (e.g. "İgnore"),
+# and its \s also covers the \x1c-\x1f separators; Hyperscan does neither, so both are
+# spelled out explicitly when translating patterns.
+_HS_CASE_VARIANTS = {"i": "\u0130\u0131", "k": "\u212a", "s": "\u017f"}
+_HS_WHITESPACE = "".join(f"\\x{{{c:x}}}" for c in range(0x3001) if chr(c).isspace())
+
+
+def _hyperscan_expression(pattern: str) -> str:
+    """
+    Translates a Python `re` pattern into a Hyperscan expression that matches at least
+    everything the original matches under re.IGNORECASE.
+    """
+    out = []
+    in_class = False
+    for token in re.findall(r"\\u[0-9A-Fa-f]{4}|\\.|.", pattern):
+        if token.startswith("\\u"):
+            # Hyperscan uses PCRE syntax for code points: \uXXXX -> \x{XXXX}
+            out.append(f"\\x{{{token[2:]}}}")
+        elif token == "\\s":
+            out.append(_HS_WHITESPACE if in_class else f"[{_HS_WHITESPACE}]")
+        elif token.lower() in _HS_CASE_VARIANTS:
+            variants = token + "".join(f"\\x{{{ord(c):x}}}" for c in _HS_CASE_VARIANTS[token.lower()])
+            out.append(variants if in_class else f"[{variants}]")
+        else:
+            if token == "[":
+                in_class = True
+            elif token == "]":
+                in_class = False
+            out.append(token)
+    return "".join(out)
+
+
+def _compile_hyperscan_db(patterns: List[str]):
+    """
+    Compiles all firewall patterns into a single Hyperscan pre-filter database.
+    A scan may report false positives but never misses text the `re` patterns match.
+    Returns None if Hyperscan is unavailable or a pattern is not supported.
+    """
+    if not HYPERSCAN_AVAILABLE:
+        return None
+
+    expressions = [_hyperscan_expression(p).encode("utf-8") for p in patterns]
+    flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+             | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_PREFILTER)
+    try:
+        db = hyperscan.Database()
+        db.compile(expressions=expressions, ids=list(range(len(expressions))), elements=len(expressions), flags=flags)
+        return db
+    except Exception as e:
+        logger.warning(f"Failed to compile Hyperscan database: {e}. Falling back to Python regex.")
+        return None
+
+
 class PromptInjectionFirewall:
     """
     A firewall that inspects prompts for potential security threats like
@@ -25,12 +128,12 @@ class PromptInjectionFirewall:
     # Regex patterns for potential prompt injection or jailbreak attempts.
     # These are heuristics and not exhaustive.
     INJECTION_PATTERNS = [
-        r"(?i)ignore\s+previous\s+instructions",
-        r"(?i)system\s+override",
-        r"(?i)debug\s+mode",
-        r"(?i)developer\s+mode",
-        r"(?i)you\s+are\s+now\s+unrestricted",
-        r"(?i)DAN\s+mode",
+        r"ignore\s+previous\s+instructions",
+        r"system\s+override",
+        r"debug\s+mode",
+        r"developer\s+mode",
+        r"you\s+are\s+now\s+unrestricted",
+        r"DAN\s+mode",
     ]
 
     # Patterns for hidden text (e.g., very small font simulation in HTML/Markdown or extensive whitespace/invisible chars)
@@ -39,54 +142,130 @@ class PromptInjectionFirewall:
         r"[\u200B-\u200D\uFEFF]", # Zero-width characters
     ]
 
-    def __init__(self, project_id: Optional[str] = None, location: str = "europe-west2"):
+    # Structured output for the LLM check: the model returns compact JSON matching this schema.
+    LLM_THREAT_TYPES = ["NONE", "INJECTION", "JAILBREAK", "ANOMALY"]
+    _LLM_GENERATION_CONFIG = GenerationConfig(
+        response_mime_type="application/json",
+        response_schema={
+            "type": "object",
+            "properties": {
+                "safe": {"type": "boolean"},
+                "threat_type": {"type": "string", "enum": LLM_THREAT_TYPES},
+                "reasoning": {"type": "string"},
+            },
+            "required": ["safe", "threat_type", "reasoning"],
+        },
+    )
+
+    # Inputs shorter than this skip the LLM check (the shortest injection pattern is 8 chars).
+    MIN_LLM_SCAN_LENGTH = 8
+
+    # Compiled once at class definition; all patterns in a group are merged into a
+    # single alternation so each scan is one pass over the text.
+    _INJECTION_RE = re.compile("|".join(f"(?:{p})" for p in INJECTION_PATTERNS), re.IGNORECASE)
+    _HIDDEN_RE = re.compile("|".join(f"(?:{p})" for p in HIDDEN_TEXT_PATTERNS))
+
+    # Hyperscan pre-filter over every pattern. Clean text (the common case) is rejected
+    # in one vectorized pass; hits (possibly false positives) fall through to `re`,
+    # which makes the final decision and extracts the segments.
+    # Scratch space is per-thread since a Hyperscan scratch cannot be shared by concurrent scans.
+    _HS_DB = _compile_hyperscan_db(HIDDEN_TEXT_PATTERNS + INJECTION_PATTERNS)
+    _hs_local = threading.local()
+
+    def __init__(self, project_id: Optional[str] = None, location: str = "europe-west2", model_name: Optional[str] = None):
         """
         Initialize the firewall with Vertex AI settings.
+        The model itself is loaded on first use (see `model`), so prompts caught by
+        the regex fast path never pay the Vertex AI setup cost.
+        `model_name` defaults to the VERTEX_AI_MODEL setting.
+        """
+        self._project_id = project_id
+        self._location = location
+        self._model_name = model_name
+
+    @cached_property
+    def model(self) -> Optional[GenerativeModel]:
+        """
+        Lazily initializes Vertex AI and loads the generative model for analysis.
+        Returns None (LLM-based scanning disabled) if initialization fails.
         """
         try:
             # Initialize Vertex AI
             # Note: In a real environment, credentials must be set.
             # Here we assume they are available or this call might fail if not mocked.
-            vertexai.init(project=project_id, location=location)
+            vertexai.init(project=self._project_id, location=self._location)
             
-            # Load the generative model for analysis
-            # We use gemini-pro or a specialized security model if available.
-            self.model = GenerativeModel("gemini-pro")
+            # Load the generative model for analysis (configurable, so retired models can be swapped without a release)
+            return GenerativeModel(self._model_name or get_settings().VERTEX_AI_MODEL)
             
         except Exception as e:
             logger.warning(f"Failed to initialize Vertex AI: {e}. LLM-based scanning will be disabled.")
-            self.model = None
+            return None
+
+    def _hyperscan_match(self, text: str) -> bool:
+        """
+        Returns True if any firewall pattern may match the text.
+        """
+        scratch = getattr(self._hs_local, "scratch", None)
+        if scratch is None:
+            scratch = self._hs_local.scratch = hyperscan.Scratch(self._HS_DB)
+
+        matched = False
+
+        def on_match(pattern_id, start, end, flags, context):
+            nonlocal matched
+            matched = True
+            return True # Abort the scan on the first hit
+
+        try:
+            self._HS_DB.scan(text.encode("utf-8", errors="replace"), match_event_handler=on_match, scratch=scratch)
+        except hyperscan.ScanTerminated:
+            pass
+        return matched
 
     def _check_regex_patterns(self, text: str) -> Optional[SecurityScanResult]:
         """
         Checks text against known malicious regex patterns.
         """
+        if self._HS_DB is not None and not self._hyperscan_match(text):
+            return None
+
         # Check for Hidden Text
-        for pattern in self.HIDDEN_TEXT_PATTERNS:
-            matches = re.findall(pattern, text)
-            if matches:
-                return SecurityScanResult(
-                    is_safe=False,
-                    risk_score=1.0,
-                    flagged_segments=matches[:5], # Limit reported segments
-                    threat_type="HIDDEN_TEXT",
-                    reasoning="Detected hidden/zero-width characters."
-                )
-
-        # Check for Injection Keywords
-        for pattern in self.INJECTION_PATTERNS:
-            matches = re.findall(pattern, text)
-            if matches:
-                return SecurityScanResult(
-                    is_safe=False,
-                    risk_score=0.9,
-                    flagged_segments=matches[:1],
-                    threat_type="INJECTION",
-                    reasoning=f"Detected potential injection keyword: {matches[0]}"
-                )
+        matches = self._HIDDEN_RE.findall(text)
+        if matches:
+            return SecurityScanResult(
+                is_safe=False,
+                risk_score=1.0,
+                flagged_segments=matches[:5], # Limit reported segments
+                threat_type="HIDDEN_TEXT",
+                reasoning="Detected hidden/zero-width characters."
+            )
+
+        # Check for Injection Keywords (stops at the first hit)
+        match = self._INJECTION_RE.search(text)
+        if match:
+            return SecurityScanResult(
+                is_safe=False,
+                risk_score=0.9,
+                flagged_segments=[match.group(0)],
+                threat_type="INJECTION",
+                reasoning=f"Detected potential injection keyword: {match.group(0)}"
+            )
         
         return None
 
+    @staticmethod
+    def _parse_llm_analysis(analysis: str) -> dict:
+        """
+        Parses the model's JSON verdict, falling back to the legacy
+        "Safe: Yes / Type: X" text format if the model ignored the schema.
+        """
+        try:
+            return orjson.loads(analysis)
+        except orjson.JSONDecodeError:
+            threat_type = next((t for t in PromptInjectionFirewall.LLM_THREAT_TYPES if f"Type: {t}" in analysis), "NONE")
+            return {"safe": "Safe: Yes" in analysis, "threat_type": threat_type, "reasoning": analysis}
+
     def _scan_with_llm(self, text: str) -> SecurityScanResult:
         """
         Uses the LLM to analyze the intent of the prompt.
@@ -109,10 +288,8 @@ class PromptInjectionFirewall:
         
         User Prompt: "{text}"
         
-        Response format:
-        - Safe: [Yes/No]
-        - Type: [NONE, INJECTION, JAILBREAK, ANOMALY]
-        - Reasoning: [Explanation]
+        Respond with JSON: "safe" (true/false), "threat_type" (NONE, INJECTION, JAILBREAK or ANOMALY)
+        and "reasoning" (a short explanation).
         """
         
         try:
@@ -122,6 +299,7 @@ class PromptInjectionFirewall:
             
             response = self.model.generate_content(
                 prompt,
+                generation_config=self._LLM_GENERATION_CONFIG,
                 safety_settings=[
                     SafetySetting(
                         category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
@@ -142,17 +320,11 @@ class PromptInjectionFirewall:
                 ]
             )
             
-            analysis = response.text
+            analysis = self._parse_llm_analysis(response.text)
+            is_safe = analysis.get("safe") is True
             
-            # Parse the response (Simplistic parsing)
-            is_safe = "Safe: Yes" in analysis
-            
-            threat_type = "NONE"
-            if "Type: INJECTION" in analysis:
-                threat_type = "INJECTION"
-            elif "Type: JAILBREAK" in analysis:
-                threat_type = "JAILBREAK"
-            elif "Type: ANOMALY" in analysis:
+            threat_type = analysis.get("threat_type", "NONE")
+            if threat_type not in self.LLM_THREAT_TYPES:
                 threat_type = "ANOMALY"
             
             # If not safe but no type found, default to INJECTION
@@ -164,7 +336,7 @@ class PromptInjectionFirewall:
                 risk_score=0.0 if is_safe else 0.8,
                 flagged_segments=[text] if not is_safe else [],
                 threat_type=threat_type, # type: ignore
-                reasoning=analysis
+                reasoning=analysis.get("reasoning")
             )
 
         except Exception as e:
@@ -181,12 +353,40 @@ class PromptInjectionFirewall:
         """
         Main entry point to scan a prompt.
         """
+        # Nothing to inspect
+        if not text or text.isspace():
+            return SecurityScanResult(
+                is_safe=True,
+                risk_score=0.0,
+                flagged_segments=[],
+                threat_type="NONE",
+                reasoning="Empty input."
+            )
+
+        cache_key = _SCAN_CACHE.key(text)
+        cached = _SCAN_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
         # 1. Regex Checks (Fast)
-        regex_result = self._check_regex_patterns(text)
-        if regex_result:
-            return regex_result
+        result = self._check_regex_patterns(text)
 
         # 2. LLM Checks (Slow but semantic)
         # For this exercise, we perform LLM check.
-        return self._scan_with_llm(text)
+        # Inputs too short to carry an injection are cleared by the regex checks alone.
+        if result is None and len(text) < self.MIN_LLM_SCAN_LENGTH:
+            result = SecurityScanResult(
+                is_safe=True,
+                risk_score=0.0,
+                flagged_segments=[],
+                threat_type="NONE",
+                reasoning="Short input; regex checks passed."
+            )
+        if result is None:
+            result = self._scan_with_llm(text)
+
+        # Anomalies (including failed LLM calls) may be transient, so they are rescanned.
+        if result.threat_type != "ANOMALY":
+            _SCAN_CACHE.put(cache_key, result)
+        return result
 
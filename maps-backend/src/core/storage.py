@@ -0,0 +1,62 @@
+import logging
+from typing import Optional
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+class ContractStore:
+    """
+    Keeps contract texts in Cloud Storage so Firestore job documents and task payloads
+    only carry a small gs:// pointer instead of the full text.
+    Objects live under tenants/{tenant_id}/jobs/{job_id}.txt, mirroring the Firestore layout.
+    """
+    def __init__(self, bucket_name: str, client: Optional[storage.Client] = None):
+        self.bucket_name = bucket_name
+        self._prefix = f"gs://{bucket_name}/"
+
+        try:
+            self.client = client or storage.Client()
+            self.bucket = self.client.bucket(bucket_name)
+        except Exception as e:
+            logger.warning(f"Failed to initialize Cloud Storage Client: {e}")
+            self.client = None
+            self.bucket = None
+
+    def upload(self, tenant_id: str, job_id: str, text: str) -> str:
+        """
+        Uploads the contract text and returns its gs:// URI.
+        """
+        if self.bucket is None:
+            raise RuntimeError("Cloud Storage Client not initialized")
+
+        blob_name = f"tenants/{tenant_id}/jobs/{job_id}.txt"
+        self.bucket.blob(blob_name).upload_from_string(text, content_type="text/plain; charset=utf-8")
+        return f"{self._prefix}{blob_name}"
+
+    def _blob_name(self, uri: str, tenant_id: str) -> str:
+        """
+        Resolves a gs:// URI to its object name.
+        The URI must point inside this bucket and the given tenant's prefix.
+        """
+        tenant_prefix = f"{self._prefix}tenants/{tenant_id}/"
+        if not uri.startswith(tenant_prefix) or ".." in uri:
+            raise ValueError(f"Contract URI {uri} is outside tenant {tenant_id}'s storage")
+        return uri[len(self._prefix):]
+
+    def download(self, uri: str, tenant_id: str) -> str:
+        """
+        Downloads the contract text behind a gs:// URI.
+        """
+        if self.bucket is None:
+            raise RuntimeError("Cloud Storage Client not initialized")
+
+        return self.bucket.blob(self._blob_name(uri, tenant_id)).download_as_text()
+
+    def delete(self, uri: str, tenant_id: str) -> None:
+        """
+        Deletes the contract text behind a gs:// URI (e.g. when its job could not be created).
+        """
+        if self.bucket is None:
+            raise RuntimeError("Cloud Storage Client not initialized")
+
+        self.bucket.blob(self._blob_name(uri, tenant_id)).delete()
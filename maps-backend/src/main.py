@@ -1,14 +1,20 @@
+import asyncio
 import logging
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, status, Response
+from fastapi import FastAPI, Request, status, Response
 from fastapi.middleware.cors import CORSMiddleware
 import firebase_admin
 import vertexai
 from firebase_admin import credentials
+from google.cloud import firestore
 
-from src.core.config import settings
+from src.core.config import get_settings
 from src.core.middleware import TenantMiddleware
-from src.core.firestore_wrapper import TenantFirestore
+from src.core.firestore_wrapper import TenantFirestore, AsyncTenantFirestore
+from src.core.queue import JobQueue
+from src.core.security_firewall import PromptInjectionFirewall
+from src.core.storage import ContractStore
 from src.api.routes import analysis
 from src.worker import handler
 
@@ -16,6 +22,45 @@ from src.worker import handler
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+_clients_lock = threading.Lock()
+_clients_initialized = False
+
+def _init_clients() -> None:
+    """
+    Initializes Firebase Admin and Vertex AI exactly once per process.
+    Called at import so the cost overlaps instance warmup, and again from
+    lifespan (where it is a no-op).
+    """
+    global _clients_initialized
+    if _clients_initialized:
+        return
+
+    with _clients_lock:
+        if _clients_initialized:
+            return
+
+        # Initialize Firebase Admin
+        try:
+            # In production (Cloud Run), credentials are auto-detected.
+            # In dev, we might need explicit credentials or GOOGLE_APPLICATION_CREDENTIALS env var.
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(options={'projectId': settings.FIREBASE_PROJECT_ID})
+            logger.info("Firebase Admin initialized.")
+        except Exception as e:
+            logger.error(f"Failed to initialize Firebase Admin: {e}")
+            # Depending on criticality, we might want to raise e here.
+
+        # Initialize Vertex AI
+        try:
+            vertexai.init(project=settings.GCP_PROJECT_ID, location=settings.VERTEX_AI_LOCATION)
+            logger.info(f"Vertex AI initialized in region {settings.VERTEX_AI_LOCATION}.")
+        except Exception as e:
+            logger.warning(f"Failed to initialize Vertex AI: {e}. AI features may be disabled.")
+
+        _clients_initialized = True
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -24,23 +69,37 @@ async def lifespan(app: FastAPI):
     """
     logger.info("Starting up application...")
 
-    # Initialize Firebase Admin
+    # Initialize Firebase Admin + Vertex AI (no-op if already done at import)
+    _init_clients()
+
+    # Shared Firestore client (used by the readiness probe)
     try:
-        # In production (Cloud Run), credentials are auto-detected.
-        # In dev, we might need explicit credentials or GOOGLE_APPLICATION_CREDENTIALS env var.
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(options={'projectId': settings.FIREBASE_PROJECT_ID})
-        logger.info("Firebase Admin initialized.")
+        app.state.firestore = firestore.Client(project=settings.FIREBASE_PROJECT_ID)
     except Exception as e:
-        logger.error(f"Failed to initialize Firebase Admin: {e}")
-        # Depending on criticality, we might want to raise e here.
+        logger.error(f"Failed to initialize Firestore client: {e}")
+        app.state.firestore = None
 
-    # Initialize Vertex AI
+    # Shared tenant-scoped Firestore client and task queue for request handlers.
+    # One client (and its gRPC channels) serves every tenant; scoping is enforced by the wrapper.
     try:
-        vertexai.init(project=settings.GCP_PROJECT_ID, location=settings.VERTEX_AI_LOCATION)
-        logger.info(f"Vertex AI initialized in region {settings.VERTEX_AI_LOCATION}.")
+        app.state.db = AsyncTenantFirestore()
     except Exception as e:
-        logger.warning(f"Failed to initialize Vertex AI: {e}. AI features may be disabled.")
+        logger.error(f"Failed to initialize tenant Firestore client: {e}")
+        app.state.db = None
+    app.state.queue = JobQueue()
+
+    # Shared Security Firewall (reused by every worker job)
+    app.state.firewall = PromptInjectionFirewall(
+        project_id=settings.GCP_PROJECT_ID,
+        location=settings.VERTEX_AI_LOCATION,
+        model_name=settings.VERTEX_AI_MODEL
+    )
+
+    # Warm the worker's OIDC cert cache before the first Cloud Task arrives
+    await handler.prewarm_oidc_certs()
+
+    # Shared contract text store (None keeps texts inline in Firestore)
+    app.state.contract_store = ContractStore(settings.CONTRACT_BUCKET) if settings.CONTRACT_BUCKET else None
 
     logger.info("Agents Loaded: Security Firewall Active, Tenant Isolation Enforced.")
 
@@ -91,7 +150,7 @@ def create_app() -> FastAPI:
             return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content="Service Unavailable")
     
     @app.get("/readiness", tags=["Health"])
-    async def readiness_check():
+    async def readiness_check(request: Request):
         """
         Readiness check endpoint that verifies external service connectivity.
         Used for Kubernetes-style ready probes.
@@ -103,10 +162,12 @@ def create_app() -> FastAPI:
         
         try:
             # Check Firestore connectivity
-            from google.cloud import firestore
-            db = firestore.Client(project=settings.FIREBASE_PROJECT_ID)
-            # Perform a lightweight read operation
-            db.collection("_healthcheck").limit(1).get()
+            db = getattr(request.app.state, "firestore", None)
+            if db is None:
+                raise RuntimeError("Firestore client not initialized")
+            # Perform a lightweight, time-bounded read off the event loop
+            query = db.collection("_healthcheck").limit(1)
+            await asyncio.to_thread(query.get, timeout=1.0)
             checks["firestore"] = True
         except Exception as e:
             logger.warning(f"Firestore health check failed: {e}")
@@ -128,4 +189,5 @@ def create_app() -> FastAPI:
 
     return app
 
+_init_clients()
 app = create_app()
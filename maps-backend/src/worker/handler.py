@@ -1,25 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from pydantic import BaseModel
 from typing import Dict, Any
+import asyncio
 import logging
 import os
-from google.auth.transport import requests
+import zlib
+import cachecontrol
+import msgspec
+import requests
+from google.auth.transport import requests as google_auth_requests
 from google.oauth2 import id_token
 
-from src.core.firestore_wrapper import TenantFirestore
+from src.core.firestore_wrapper import AsyncTenantFirestore
 from src.core.security_firewall import PromptInjectionFirewall
+from src.core.storage import ContractStore
 from src.core.security import current_tenant
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-class WorkerPayload(BaseModel):
+# Shared transport for token verification: one long-lived session whose responses are
+# cached per their Cache-Control headers, so Google's signing certs are fetched once per
+# expiry window instead of on every verification.
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+_AUTH_REQUEST = google_auth_requests.Request(session=cachecontrol.CacheControl(requests.Session()))
+
+# Cloud Tasks uses the task's target URL as the default OIDC audience; JobQueue targets
+# {SERVICE_URL}/worker/process, so tokens minted for any other audience are rejected.
+_SERVICE_URL = os.getenv("SERVICE_URL")
+_EXPECTED_AUDIENCE = f"{_SERVICE_URL.rstrip('/')}/worker/process" if _SERVICE_URL else None
+if _EXPECTED_AUDIENCE is None:
+    logger.warning("SERVICE_URL is not set; worker OIDC tokens are verified without an audience check.")
+
+class WorkerPayload(msgspec.Struct):
     job_id: str
     tenant_id: str
     data: Dict[str, Any]
 
-def verify_oidc_token(request: Request):
+# Compiled once; decodes and validates the raw task body in a single pass.
+_PAYLOAD_DECODER = msgspec.json.Decoder(WorkerPayload)
+
+# Upper bound on a decompressed task body (guards against decompression bombs)
+_MAX_PAYLOAD_BYTES = 32 * 1024 * 1024
+
+def _read_task_body(body: bytes, content_encoding: str) -> bytes:
+    """
+    Returns the raw JSON body, decompressing gzip bodies produced by JobQueue.
+    """
+    if content_encoding.lower() != "gzip":
+        return body
+
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    data = decompressor.decompress(body, _MAX_PAYLOAD_BYTES)
+    if decompressor.unconsumed_tail:
+        raise ValueError("Decompressed payload exceeds size limit")
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip payload")
+    return data
+
+async def prewarm_oidc_certs() -> None:
+    """
+    Fetches Google's OIDC certs into the transport cache so the first task doesn't pay for it.
+    """
+    if os.getenv("SKIP_AUTH_CHECK", "false").lower() == "true":
+        return
+
+    try:
+        await asyncio.to_thread(_AUTH_REQUEST, url=GOOGLE_OAUTH2_CERTS_URL, method="GET", timeout=5)
+    except Exception as e:
+        logger.warning(f"Failed to pre-fetch OIDC certs: {e}")
+
+async def verify_oidc_token(request: Request):
     """
     Verifies the OIDC token in the Authorization header.
     Ensures the request comes from Cloud Tasks (or a trusted source).
@@ -35,15 +86,8 @@ def verify_oidc_token(request: Request):
         return
 
     try:
-        # Verify the token
-        # You normally specify the audience (your service URL)
-        # For simplicity, we might verify signature without audience if we don't know it exactly dynamically,
-        # but robust security requires audience check.
-        # Assuming SERVICE_URL is set.
-        # id_token.verify_oauth2_token(token, requests.Request(), audience=os.getenv("SERVICE_URL"))
-        
-        # We can also check email claim if we want to ensure it's OUR service account.
-        id_info = id_token.verify_oauth2_token(token, requests.Request())
+        # Certs come from the cached session; a miss still fetches over HTTP, so this runs off the event loop.
+        id_info = await asyncio.to_thread(id_token.verify_oauth2_token, token, _AUTH_REQUEST, _EXPECTED_AUDIENCE)
         
         # Optional: Check issuer or email
         # if id_info['email'] != expected_service_account: raise...
@@ -62,18 +106,22 @@ def run_analysis_logic(text: str) -> Dict[str, Any]:
     }
 
 @router.post("/process", status_code=200)
-async def process_job(
-    payload: WorkerPayload,
-    request: Request
-):
+async def process_job(request: Request):
     """
     Worker handler to process the job.
     """
     # 1. Verify Security (OIDC)
-    verify_oidc_token(request)
+    await verify_oidc_token(request)
+
+    try:
+        body = _read_task_body(await request.body(), request.headers.get("Content-Encoding", ""))
+        payload = _PAYLOAD_DECODER.decode(body)
+    except (msgspec.DecodeError, ValueError, zlib.error) as e: # DecodeError also covers msgspec.ValidationError
+        raise HTTPException(status_code=422, detail=f"Invalid payload: {e}")
 
     job_id = payload.job_id
     tenant_id = payload.tenant_id
+    contract_uri = payload.data.get("contract_uri")
     contract_text = payload.data.get("contract_text", "")
 
     logger.info(f"Processing job {job_id} for tenant {tenant_id}")
@@ -83,24 +131,41 @@ async def process_job(
     token = current_tenant.set(tenant_id)
     
     try:
-        db = TenantFirestore()
+        db: AsyncTenantFirestore = request.app.state.db
+        if db is None:
+            # 503 makes Cloud Tasks retry once Firestore is reachable again
+            raise HTTPException(status_code=503, detail="Database unavailable")
         
         # 3. Retrieve Job (Verify it exists and is QUEUED)
         # Note: We use the tenant-scoped DB wrapper which relies on current_tenant
         job_ref = db.collection(f"tenants/{tenant_id}/jobs").document(job_id)
-        job_snap = job_ref.get()
+        job_snap = await job_ref.get()
         
         if not job_snap.exists:
             logger.error(f"Job {job_id} not found")
             return # Acknowledge task to remove from queue
+
+        # Large contracts are passed by reference to Cloud Storage
+        if contract_uri:
+            store: ContractStore = request.app.state.contract_store
+            try:
+                contract_text = await asyncio.to_thread(store.download, contract_uri, tenant_id)
+            except Exception as e:
+                logger.error(f"Failed to load contract text for job {job_id}: {e}")
+                await job_ref.update({
+                    "status": "FAILED",
+                    "error": "Contract text unavailable"
+                })
+                return
             
         # 4. Security Scan
-        firewall = PromptInjectionFirewall()
-        scan_result = firewall.scan_prompt(contract_text)
+        firewall: PromptInjectionFirewall = request.app.state.firewall
+        # Regex + LLM scan is blocking, so it runs in a worker thread
+        scan_result = await asyncio.to_thread(firewall.scan_prompt, contract_text)
         
         if not scan_result.is_safe:
             logger.warning(f"Security Scan Failed for job {job_id}: {scan_result.reasoning}")
-            job_ref.update({
+            await job_ref.update({
                 "status": "FAILED",
                 "error": f"Security Policy Violation: {scan_result.threat_type}",
                 "security_scan": scan_result.model_dump()
@@ -108,14 +173,13 @@ async def process_job(
             return
 
         # 5. Run Analysis
+        # No intermediate PROCESSING write: the job goes straight from QUEUED to its
+        # final status in a single Firestore update.
         try:
-            # Update status to PROCESSING
-            job_ref.update({"status": "PROCESSING"})
-            
             result = run_analysis_logic(contract_text)
             
             # 6. Complete
-            job_ref.update({
+            await job_ref.update({
                 "status": "COMPLETED",
                 "result": result,
                 "security_scan": scan_result.model_dump()
@@ -123,7 +187,7 @@ async def process_job(
             
         except Exception as e:
             logger.error(f"Analysis failed for job {job_id}: {e}")
-            job_ref.update({
+            await job_ref.update({
                 "status": "FAILED",
                 "error": str(e)
             })
@@ -1,9 +1,13 @@
 import os
-import json
-import glob
+import numpy as np
+import orjson
+import pathlib
 import sys
 import argparse
+import asyncio
 import difflib
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, List, Tuple
 from jinja2 import Template
 import unittest.mock
@@ -17,6 +21,20 @@ except ImportError:
     print("Error: Could not import src.agent.main. Ensure the module exists.")
     sys.exit(1)
 
+# Optional RapidFuzz import (C++ similarity; falls back to difflib)
+try:
+    from rapidfuzz.fuzz import ratio as _fuzz_ratio
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# Optional Numba import (JIT-compiled fallback when RapidFuzz is not installed)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # Optional Vertex AI import
 try:
     import vertexai
@@ -83,71 +101,186 @@ HTML_TEMPLATE = """
 </html>
 """
 
-def semantic_similarity(text1: str, text2: str, use_llm: bool = False) -> float:
+# Parsed and compiled once at import rather than on every render
+REPORT_TEMPLATE = Template(HTML_TEMPLATE)
+
+SIMILARITY_THRESHOLD = 0.8
+
+# Compared field names, interned so lookups against interned record keys hit on identity
+BOOLEAN_FIELDS = tuple(sys.intern(key) for key in ("is_safe", "has_indemnity"))
+RISK_SCORE_FIELD = sys.intern("risk_score")
+TEXT_FIELDS = tuple(sys.intern(key) for key in ("summary", "reasoning"))
+
+# Upper bound on concurrent Vertex AI requests during the batched semantic check
+_LLM_CONCURRENCY = 16
+
+def _lcs_length(a: np.ndarray, b: np.ndarray) -> int:
+    """
+    Length of the longest common subsequence of two code-point arrays (single-row DP, O(len(a) * len(b))).
+    """
+    row = np.zeros(b.shape[0] + 1, dtype=np.int64)
+    for i in range(a.shape[0]):
+        diagonal = 0
+        for j in range(b.shape[0]):
+            above = row[j + 1]
+            if a[i] == b[j]:
+                row[j + 1] = diagonal + 1
+            elif row[j] > above:
+                row[j + 1] = row[j]
+            diagonal = above
+    return row[b.shape[0]]
+
+if NUMBA_AVAILABLE:
+    # cache=True persists the compiled kernel, so only the first run pays the multi-second compile
+    _lcs_length = njit(cache=True)(_lcs_length)
+
+def _indel_ratio(text1: str, text2: str) -> float:
     """
-    Calculates semantic similarity between two text strings.
+    Normalized Indel similarity, 2 * LCS / (len1 + len2): the same measure as rapidfuzz.fuzz.ratio / 100.
+    """
+    a = np.frombuffer(text1.encode("utf-32-le"), dtype=np.uint32)
+    b = np.frombuffer(text2.encode("utf-32-le"), dtype=np.uint32)
+    return 2.0 * _lcs_length(a, b) / (a.shape[0] + b.shape[0])
+
+def semantic_similarity(text1: str, text2: str) -> float:
+    """
+    Calculates the heuristic similarity between two text strings.
+    Pairs below SIMILARITY_THRESHOLD can additionally be confirmed by the LLM (see llm_equivalence_batch).
     """
     if not text1 or not text2:
         return 0.0 if text1 != text2 else 1.0
         
-    # 1. Heuristic Check using SequenceMatcher
-    matcher = difflib.SequenceMatcher(None, str(text1), str(text2))
-    ratio = matcher.ratio()
-    
-    if ratio > 0.8:
-        return ratio
+    # Heuristic Check: RapidFuzz's Indel ratio, else the Numba-compiled equivalent, else SequenceMatcher.
+    # Numba only pays off without RapidFuzz: its DP is O(n*m) while RapidFuzz uses bit-parallel C++.
+    if RAPIDFUZZ_AVAILABLE:
+        return _fuzz_ratio(text1, text2) / 100.0
+    if NUMBA_AVAILABLE:
+        return _indel_ratio(text1, text2)
+    return difflib.SequenceMatcher(None, text1, text2).ratio()
 
-    # 2. Vertex AI Check (Bonus)
-    if use_llm and VERTEX_AVAILABLE:
+@functools.cache
+def _get_llm_model():
+    """
+    One GenerativeModel per process, shared by every semantic check.
+    """
+    return GenerativeModel("gemini-1.5-flash")
+
+async def _llm_equivalent(text1: str, text2: str, semaphore: asyncio.Semaphore) -> bool:
+    prompt = f"Do these two explanations mean the same thing? Yes/No.\n\nExplanation 1: {text1}\nExplanation 2: {text2}"
+    async with semaphore:
         try:
-            model = GenerativeModel("gemini-1.5-flash")
-            prompt = f"Do these two explanations mean the same thing? Yes/No.\n\nExplanation 1: {text1}\nExplanation 2: {text2}"
-            response = model.generate_content(prompt)
-            if "yes" in response.text.lower():
-                return 1.0
+            response = await _get_llm_model().generate_content_async(prompt)
+            return "yes" in response.text.lower()
         except Exception as e:
             print(f"Warning: Vertex AI semantic check failed: {e}")
-            
-    return ratio
+            return False
+
+def llm_equivalence_batch(pairs: List[Tuple[str, str]]) -> List[bool]:
+    """
+    Asks Vertex AI whether each (actual, expected) pair means the same thing.
+    All pairs are sent concurrently, so the whole batch costs roughly one round-trip.
+    """
+    if not pairs or not VERTEX_AVAILABLE:
+        return [False] * len(pairs)
+
+    async def run() -> List[bool]:
+        semaphore = asyncio.Semaphore(_LLM_CONCURRENCY)
+        return await asyncio.gather(*(_llm_equivalent(a, b, semaphore) for a, b in pairs))
+
+    return asyncio.run(run())
 
-def compare_result(actual: Dict[str, Any], expected: Dict[str, Any], use_llm: bool = False) -> Tuple[bool, List[str]]:
+def _as_text(value: Any) -> str:
+    """
+    Coerces a field value to str once; strings pass through without a copy and missing values become "".
+    """
+    if isinstance(value, str):
+        return value
+    return "" if value is None else str(value)
+
+def compare_result(actual: Dict[str, Any], expected: Dict[str, Any], use_llm: bool = False, fail_fast: bool = False) -> Tuple[bool, List[str], List[Tuple[str, str, str, float]]]:
     """
     Compares actual result with expected ground truth.
-    Returns (Passed (bool), List of diff strings).
+    Returns (Passed (bool), List of diff strings, Pending LLM checks).
+    With use_llm, text fields below the similarity threshold are not failed here; they are
+    returned as (key, actual_text, expected_text, similarity) for a batched LLM check.
+    Checks run cheapest first (boolean, numeric, fuzzy text); with fail_fast the comparison
+    stops at the first diff, skipping the similarity and LLM checks of already-failed cases.
     """
     passed = True
     diffs = []
+    llm_checks = []
     
     # Check boolean fields strictly
-    for key in ["is_safe", "has_indemnity"]:
+    for key in BOOLEAN_FIELDS:
         if key in expected:
             if actual.get(key) != expected[key]:
                 passed = False
                 diffs.append(f"Field '{key}': Expected {expected[key]}, got {actual.get(key)}")
+                if fail_fast:
+                    return passed, diffs, llm_checks
 
     # Check numeric fields with tolerance
-    if "risk_score" in expected:
-        actual_score = actual.get("risk_score", 0.0)
-        expected_score = expected["risk_score"]
+    if RISK_SCORE_FIELD in expected:
+        actual_score = actual.get(RISK_SCORE_FIELD, 0.0)
+        expected_score = expected[RISK_SCORE_FIELD]
         if abs(actual_score - expected_score) > 0.1:
             passed = False
             diffs.append(f"Field 'risk_score': Expected {expected_score}, got {actual_score}")
+            if fail_fast:
+                return passed, diffs, llm_checks
 
     # Check text fields with fuzzy matching
-    for key in ["summary", "reasoning"]:
+    for key in TEXT_FIELDS:
         if key in expected:
-            actual_text = str(actual.get(key, ""))
-            expected_text = str(expected[key])
-            similarity = semantic_similarity(actual_text, expected_text, use_llm)
-            if similarity < 0.8:
-                passed = False
-                diffs.append(f"Field '{key}': Low similarity ({similarity:.2f}). Expected: '{expected_text}', Got: '{actual_text}'")
+            actual_text = _as_text(actual.get(key))
+            expected_text = _as_text(expected[key])
+            similarity = semantic_similarity(actual_text, expected_text)
+            if similarity < SIMILARITY_THRESHOLD:
+                if use_llm:
+                    llm_checks.append((key, actual_text, expected_text, similarity))
+                else:
+                    passed = False
+                    diffs.append(low_similarity_diff(key, similarity, expected_text, actual_text))
+                    if fail_fast:
+                        return passed, diffs, llm_checks
                 
-    return passed, diffs
+    return passed, diffs, llm_checks
+
+def low_similarity_diff(key: str, similarity: float, expected_text: str, actual_text: str) -> str:
+    return f"Field '{key}': Low similarity ({similarity:.2f}). Expected: '{expected_text}', Got: '{actual_text}'"
 
-def calculate_metrics(results: List[Dict[str, Any]]) -> Dict[str, float]:
+def apply_llm_checks(results: List[Dict[str, Any]]) -> None:
+    """
+    Resolves the pending LLM checks of all results in one concurrent batch,
+    failing the fields the LLM does not consider equivalent.
+    """
+    pending = [(result, check) for result in results for check in result.pop("llm_checks", [])]
+    if not pending:
+        return
+
+    print(f"Running {len(pending)} LLM semantic checks...")
+    verdicts = llm_equivalence_batch([(actual_text, expected_text) for _, (_, actual_text, expected_text, _) in pending])
+
+    for (result, (key, actual_text, expected_text, similarity)), equivalent in zip(pending, verdicts):
+        if not equivalent:
+            result["passed"] = False
+            result["diffs"].append(low_similarity_diff(key, similarity, expected_text, actual_text))
+
+def result_columns(results: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Transposes the per-contract results into boolean columns (passed, actual_is_safe, expected_is_safe).
+    A missing is_safe value counts as False (risky).
+    """
+    n = len(results)
+    passed = np.fromiter((bool(res["passed"]) for res in results), dtype=bool, count=n)
+    actual_safe = np.fromiter((bool(res["actual_is_safe"]) for res in results), dtype=bool, count=n)
+    expected_safe = np.fromiter((bool(res["expected_is_safe"]) for res in results), dtype=bool, count=n)
+    return passed, actual_safe, expected_safe
+
+def calculate_metrics(passed: np.ndarray, actual_safe: np.ndarray, expected_safe: np.ndarray) -> Dict[str, float]:
     """
     Calculates Precision, Recall, and Accuracy based on 'is_safe' classification.
+    Takes the boolean columns built by result_columns.
     Note: This assumes binary classification where 'is_safe=False' is Positive (Risky) detection?
     Usually:
       - True Positive (TP): Predicted Risky (Unsafe), Actual Risky (Unsafe)
@@ -159,37 +292,16 @@ def calculate_metrics(results: List[Dict[str, Any]]) -> Dict[str, float]:
     Class 1: Risky (is_safe=False)
     Class 0: Safe (is_safe=True)
     """
-    tp = 0
-    tn = 0
-    fp = 0
-    fn = 0
-    total = 0
-    matches = 0
-    
-    for res in results:
-        total += 1
-        # We need expected and actual is_safe to calc metrics
-        # Assuming result object has these stashed or we pass them.
-        # Let's store them in the result dict passed to this function.
-        
-        actual_safe = res["actual_is_safe"]
-        expected_safe = res["expected_is_safe"]
-        
-        if res["passed"]:
-            matches += 1
-            
-        # Logic for Classification Metrics (Risk Detection)
-        actual_risky = not actual_safe
-        expected_risky = not expected_safe
-        
-        if actual_risky and expected_risky:
-            tp += 1
-        elif not actual_risky and not expected_risky:
-            tn += 1
-        elif actual_risky and not expected_risky:
-            fp += 1
-        elif not actual_risky and expected_risky:
-            fn += 1
+    # Bulk boolean arithmetic over the columns, no per-result branching
+    total = len(passed)
+    matches = int(passed.sum())
+    actual_risky = ~actual_safe
+    expected_risky = ~expected_safe
+
+    tp = int((actual_risky & expected_risky).sum())
+    tn = int((actual_safe & expected_safe).sum())
+    fp = int((actual_risky & expected_safe).sum())
+    fn = int((actual_safe & expected_risky).sum())
 
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
     recall = tp / (tp + fn) if (tp + fn) > 0 else 0.0
@@ -216,9 +328,60 @@ def calculate_metrics(results: List[Dict[str, Any]]) -> Dict[str, float]:
         "total_count": total
     }
 
+def _init_worker():
+    """
+    Pool initializer: patches are not carried over to worker processes, so each worker
+    installs the DB mock once for its whole lifetime.
+    """
+    # Mocking DB calls globally if needed (The agent mock I wrote doesn't use DB, but for safety in real env)
+    unittest.mock.patch('src.core.firestore_wrapper.TenantFirestore').start()
+
+def _intern_keys(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuilds a flat result record with interned keys.
+    Done in the worker: keys unpickled from the parent process are not interned.
+    """
+    return {sys.intern(key) if isinstance(key, str) else key: value for key, value in record.items()}
+
+def _evaluate_contract(contract_path: str, expected: Dict[str, Any], use_llm: bool, fail_fast: bool) -> Dict[str, Any]:
+    """
+    Runs the agent on a single contract and compares it with its ground truth.
+    Executed in a worker process.
+    """
+    filename = os.path.basename(contract_path)
+
+    text = pathlib.Path(contract_path).read_text(encoding="utf-8")
+    
+    try:
+        actual = analyze_contract(text)
+    except Exception as e:
+        print(f"Error processing {filename}: {e}")
+        return {
+            "filename": filename,
+            "passed": False,
+            "diffs": [f"Exception: {str(e)}"],
+            "actual_is_safe": False, # Default fallback
+            "expected_is_safe": expected.get("is_safe", False)
+        }
+
+    actual = _intern_keys(actual)
+    expected = _intern_keys(expected)
+    passed, diffs, llm_checks = compare_result(actual, expected, use_llm=use_llm, fail_fast=fail_fast)
+    
+    return {
+        "filename": filename,
+        "passed": passed,
+        "diffs": diffs,
+        "llm_checks": llm_checks,
+        "actual_is_safe": actual.get("is_safe"),
+        "expected_is_safe": expected.get("is_safe")
+    }
+
 def main():
     parser = argparse.ArgumentParser(description="Run Golden Set Evaluation")
     parser.add_argument("--use-llm", action="store_true", help="Use Vertex AI for semantic comparison")
+    parser.add_argument("--fail-fast-diff", action="store_true", help="Stop comparing a contract at its first diff")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: CPU count)")
     args = parser.parse_args()
 
     # Load Ground Truth
@@ -226,62 +389,48 @@ def main():
         print(f"Error: Ground truth file not found at {GROUND_TRUTH_PATH}")
         sys.exit(1)
 
-    with open(GROUND_TRUTH_PATH, 'r') as f:
-        ground_truth = json.load(f)
-
-    results = []
+    with open(GROUND_TRUTH_PATH, 'rb') as f:
+        ground_truth = orjson.loads(f.read())
 
     # Find Contracts
-    contract_files = glob.glob(os.path.join(CONTRACTS_DIR, "*.txt"))
+    # scandir yields names with cached file types, so no per-file stat calls as with glob
+    contract_files = []
+    if os.path.isdir(CONTRACTS_DIR):
+        with os.scandir(CONTRACTS_DIR) as entries:
+            contract_files = [entry.path for entry in entries if entry.name.endswith(".txt") and entry.is_file()]
     if not contract_files:
         print(f"Error: No contract files found in {CONTRACTS_DIR}")
         sys.exit(1)
 
     print(f"Found {len(contract_files)} contracts. Running evaluation...")
 
-    # Mocking DB calls globally if needed (The agent mock I wrote doesn't use DB, but for safety in real env)
-    with unittest.mock.patch('src.core.firestore_wrapper.TenantFirestore') as MockDB:
-        for contract_path in contract_files:
-            filename = os.path.basename(contract_path)
-            
-            if filename not in ground_truth:
-                print(f"Warning: No ground truth for {filename}, skipping.")
-                continue
-                
-            expected = ground_truth[filename]
-            
-            with open(contract_path, 'r') as f:
-                text = f.read()
-            
-            try:
-                actual = analyze_contract(text)
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                results.append({
-                    "filename": filename,
-                    "passed": False,
-                    "diffs": [f"Exception: {str(e)}"],
-                    "actual_is_safe": False, # Default fallback
-                    "expected_is_safe": expected.get("is_safe", False)
-                })
-                continue
-
-            passed, diffs = compare_result(actual, expected, use_llm=args.use_llm)
+    paths = []
+    expected_results = []
+    for contract_path in contract_files:
+        filename = os.path.basename(contract_path)
+        
+        if filename not in ground_truth:
+            print(f"Warning: No ground truth for {filename}, skipping.")
+            continue
             
-            results.append({
-                "filename": filename,
-                "passed": passed,
-                "diffs": diffs,
-                "actual_is_safe": actual.get("is_safe"),
-                "expected_is_safe": expected.get("is_safe")
-            })
+        paths.append(contract_path)
+        expected_results.append(ground_truth[filename])
+
+    # Contracts are independent, so they are evaluated across a process pool (map keeps file order)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        results = list(executor.map(
+            _evaluate_contract, paths, expected_results,
+            [args.use_llm] * len(paths), [args.fail_fast_diff] * len(paths)
+        ))
+
+    # Batched LLM semantic checks (only populated with --use-llm)
+    apply_llm_checks(results)
 
     # Calculate Metrics
-    metrics = calculate_metrics(results)
+    metrics = calculate_metrics(*result_columns(results))
     
     # Render Report
-    template = Template(HTML_TEMPLATE)
-    html_content = template.render(
+    html_content = REPORT_TEMPLATE.render(
         results=results,
         total=metrics["total_count"],
         passed=metrics["passed_count"],
@@ -1,8 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from src.main import app
-from src.api.routes.analysis import get_db, get_queue
+from src.api.routes.analysis import get_db, get_queue, get_contract_store
+from src.core.queue import JobQueue
+from src.core.security_firewall import SecurityScanResult
 
 client = TestClient(app)
 
@@ -38,7 +40,8 @@ def test_analyze_endpoint_with_auth(mock_auth):
 
 def test_analyze_endpoint_with_auth_refactored(mock_auth):
     mock_db = MagicMock()
-    mock_queue = MagicMock()
+    mock_db.collection.return_value.document.return_value = AsyncMock()
+    mock_queue = MagicMock(spec=JobQueue)
     
     app.dependency_overrides[get_db] = lambda: mock_db
     app.dependency_overrides[get_queue] = lambda: mock_queue
@@ -59,11 +62,72 @@ def test_analyze_endpoint_with_auth_refactored(mock_auth):
         assert "tenants/tenant-test/jobs" in args[0]
         
         # Verify Queue interaction
-        mock_queue.enqueue_job.assert_called_once()
+        mock_db.collection.return_value.document.return_value.set.assert_awaited_once()
+        mock_queue.enqueue_job_async.assert_awaited_once()
         
     finally:
         app.dependency_overrides = {}
 
+def test_analyze_endpoint_stores_contract_in_gcs(mock_auth):
+    mock_db = MagicMock()
+    job_ref = AsyncMock()
+    mock_db.collection.return_value.document.return_value = job_ref
+    mock_queue = MagicMock(spec=JobQueue)
+    mock_store = MagicMock()
+    mock_store.upload.return_value = "gs://contracts/tenants/tenant-test/jobs/job.txt"
+
+    app.dependency_overrides[get_db] = lambda: mock_db
+    app.dependency_overrides[get_queue] = lambda: mock_queue
+    app.dependency_overrides[get_contract_store] = lambda: mock_store
+
+    try:
+        response = client.post(
+            "/api/v1/analyze",
+            json={"contract_text": "test"},
+            headers={"Authorization": "Bearer token"}
+        )
+
+        assert response.status_code == 202
+        mock_store.upload.assert_called_once()
+        assert mock_store.upload.call_args.args[0] == "tenant-test"
+
+        # Only the pointer reaches Firestore and the task payload
+        job_doc = job_ref.set.await_args.args[0]
+        assert job_doc["contract_uri"] == mock_store.upload.return_value
+        assert "contract_text" not in job_doc
+        _, kwargs = mock_queue.enqueue_job_async.await_args
+        assert kwargs["payload"] == {"contract_uri": mock_store.upload.return_value}
+
+    finally:
+        app.dependency_overrides = {}
+
+def test_analyze_endpoint_deletes_contract_when_job_creation_fails(mock_auth):
+    mock_db = MagicMock()
+    job_ref = AsyncMock()
+    job_ref.set.side_effect = Exception("Firestore unavailable")
+    mock_db.collection.return_value.document.return_value = job_ref
+    mock_queue = MagicMock(spec=JobQueue)
+    mock_store = MagicMock()
+    mock_store.upload.return_value = "gs://contracts/tenants/tenant-test/jobs/job.txt"
+
+    app.dependency_overrides[get_db] = lambda: mock_db
+    app.dependency_overrides[get_queue] = lambda: mock_queue
+    app.dependency_overrides[get_contract_store] = lambda: mock_store
+
+    try:
+        response = client.post(
+            "/api/v1/analyze",
+            json={"contract_text": "test"},
+            headers={"Authorization": "Bearer token"}
+        )
+
+        assert response.status_code == 500
+        mock_store.delete.assert_called_once_with(mock_store.upload.return_value, "tenant-test")
+        mock_queue.enqueue_job_async.assert_not_awaited()
+
+    finally:
+        app.dependency_overrides = {}
+
 def test_analyze_endpoint_no_auth():
     # Even if no auth, we mock DB to avoid GCloud error if dependency is resolved
     mock_db = MagicMock()
@@ -77,3 +141,91 @@ def test_analyze_endpoint_no_auth():
         assert response.status_code == 403
     finally:
         app.dependency_overrides = {}
+
+_WORKER_HEADERS = {"Authorization": "Bearer task-token"}
+_SAFE_SCAN = SecurityScanResult(is_safe=True, risk_score=0.0, flagged_segments=[], threat_type="NONE")
+
+@pytest.fixture
+def worker_job(monkeypatch):
+    """
+    Worker state with OIDC checks skipped; yields the job document ref the worker updates.
+    """
+    monkeypatch.setenv("SKIP_AUTH_CHECK", "true")
+    job_ref = AsyncMock()
+    job_ref.get.return_value.exists = True
+    mock_db = MagicMock()
+    mock_db.collection.return_value.document.return_value = job_ref
+    mock_firewall = MagicMock()
+    mock_firewall.scan_prompt.return_value = _SAFE_SCAN
+    monkeypatch.setattr(app.state, "db", mock_db, raising=False)
+    monkeypatch.setattr(app.state, "firewall", mock_firewall, raising=False)
+    yield job_ref
+
+def test_worker_completes_job(worker_job):
+    response = client.post(
+        "/worker/process",
+        json={"job_id": "job-1", "tenant_id": "tenant-test", "data": {"contract_text": "test"}},
+        headers=_WORKER_HEADERS
+    )
+
+    assert response.status_code == 200
+    app.state.db.collection.assert_called_once_with("tenants/tenant-test/jobs")
+    worker_job.get.assert_awaited_once()
+    worker_job.update.assert_awaited_once()
+    assert worker_job.update.await_args.args[0]["status"] == "COMPLETED"
+
+def test_worker_rejects_wrong_field_type(worker_job):
+    response = client.post(
+        "/worker/process",
+        json={"job_id": 123, "tenant_id": "tenant-test", "data": {}},
+        headers=_WORKER_HEADERS
+    )
+
+    assert response.status_code == 422
+    worker_job.get.assert_not_awaited()
+
+def test_worker_acknowledges_missing_job(worker_job):
+    worker_job.get.return_value.exists = False
+
+    response = client.post(
+        "/worker/process",
+        json={"job_id": "job-1", "tenant_id": "tenant-test", "data": {"contract_text": "test"}},
+        headers=_WORKER_HEADERS
+    )
+
+    assert response.status_code == 200
+    worker_job.update.assert_not_awaited()
+    app.state.firewall.scan_prompt.assert_not_called()
+
+def test_worker_fails_job_when_contract_download_fails(worker_job, monkeypatch):
+    mock_store = MagicMock()
+    mock_store.download.side_effect = ValueError("outside tenant storage")
+    monkeypatch.setattr(app.state, "contract_store", mock_store, raising=False)
+
+    response = client.post(
+        "/worker/process",
+        json={"job_id": "job-1", "tenant_id": "tenant-test", "data": {"contract_uri": "gs://contracts/tenants/other/jobs/job-1.txt"}},
+        headers=_WORKER_HEADERS
+    )
+
+    assert response.status_code == 200
+    mock_store.download.assert_called_once_with("gs://contracts/tenants/other/jobs/job-1.txt", "tenant-test")
+    worker_job.update.assert_awaited_once_with({"status": "FAILED", "error": "Contract text unavailable"})
+    app.state.firewall.scan_prompt.assert_not_called()
+
+def test_worker_verifies_token_audience(worker_job, monkeypatch):
+    monkeypatch.setenv("SKIP_AUTH_CHECK", "false")
+    monkeypatch.setattr("src.worker.handler._EXPECTED_AUDIENCE", "https://maps.example.com/worker/process")
+
+    with patch("src.worker.handler.id_token.verify_oauth2_token") as mock_verify:
+        mock_verify.side_effect = ValueError("Token has wrong audience")
+        response = client.post(
+            "/worker/process",
+            json={"job_id": "job-1", "tenant_id": "tenant-test", "data": {"contract_text": "test"}},
+            headers=_WORKER_HEADERS
+        )
+
+    assert response.status_code == 401
+    assert mock_verify.call_args.args[0] == "task-token"
+    assert mock_verify.call_args.args[2] == "https://maps.example.com/worker/process"
+    worker_job.get.assert_not_awaited()
@@ -0,0 +1,44 @@
+import pytest
+from src.core import config
+from src.core.config import get_settings, MAX_CORS_ORIGINS
+
+@pytest.fixture
+def env(monkeypatch):
+    """
+    Isolates get_settings from the developer's .env and the cached instance.
+    """
+    monkeypatch.setattr(config, "_DOTENV_VALUES", {})
+    monkeypatch.setenv("GCP_PROJECT_ID", "test-project")
+    monkeypatch.setenv("FIREBASE_PROJECT_ID", "test-project")
+    get_settings.cache_clear()
+    yield monkeypatch
+    get_settings.cache_clear()
+
+@pytest.mark.parametrize("raw", [
+    # The comma-separated form used in .env.example
+    "http://localhost:3000,https://app.example.com",
+    '["http://localhost:3000", "https://app.example.com"]',
+    " HTTP://LOCALHOST:3000/ , https://app.example.com,http://localhost:3000",
+])
+def test_cors_origins_are_parsed_and_normalized(env, raw):
+    env.setenv("CORS_ORIGINS", raw)
+    assert get_settings().CORS_ORIGINS == ["http://localhost:3000", "https://app.example.com"]
+
+def test_empty_cors_origins(env):
+    env.setenv("CORS_ORIGINS", "")
+    assert get_settings().CORS_ORIGINS == []
+
+def test_cors_origins_are_capped(env):
+    env.setenv("CORS_ORIGINS", ",".join(f"https://app{i}.example.com" for i in range(MAX_CORS_ORIGINS + 1)))
+    with pytest.raises(ValueError):
+        get_settings()
+
+def test_environment_overrides_dotenv(env):
+    env.delenv("CONTRACT_BUCKET", raising=False)
+    env.setattr(config, "_DOTENV_VALUES", {"GCP_PROJECT_ID": "from-dotenv", "CONTRACT_BUCKET": "dotenv-bucket"})
+    settings = get_settings()
+    assert settings.GCP_PROJECT_ID == "test-project"
+    assert settings.CONTRACT_BUCKET == "dotenv-bucket"
+
+def test_get_settings_is_cached(env):
+    assert get_settings() is get_settings()
@@ -1,13 +1,23 @@
 import pytest
-from unittest.mock import MagicMock, patch
+import asyncio
+import time
+from unittest.mock import MagicMock, AsyncMock, patch
+from types import SimpleNamespace
+from typing import NamedTuple
 from fastapi import FastAPI, Request, Depends, status
 from fastapi.testclient import TestClient
-from src.core.security import tenant_scoped, SecurityBreachError, current_tenant
-from src.core.firestore_wrapper import TenantFirestore
+from src.core.security import tenant_scoped, SecurityBreachError, current_tenant, _TOKEN_CACHE
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore_v1
+from google.cloud.firestore_v1.types import firestore, write
+from src.core.firestore_wrapper import (
+    TenantFirestore, AsyncTenantFirestore, AsyncTenantDocumentReference, TenantCollectionReference,
+)
 
-# Mock firebase_admin
-with patch("firebase_admin.auth.verify_id_token") as mock_verify:
-    pass # Just to ensure we can patch it in tests
+# Authorization headers shared by the HTTP tests (verification itself is mocked)
+_AUTH_VALID = {"Authorization": "Bearer valid-token"}
+_AUTH_BAD = {"Authorization": "Bearer bad-token"}
+_AUTH_GENERIC = {"Authorization": "Bearer token"}
 
 # Create a simple FastAPI app for testing middleware
 app = FastAPI()
@@ -28,181 +38,306 @@ async def db_test(request: Request, path: str):
     col = db.collection(path)
     return {"path": path, "status": "accessed"}
 
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def client():
+    # One client (and one lifespan startup/shutdown) for every HTTP test in this module
+    with TestClient(app) as test_client:
+        yield test_client
 
-def test_tenant_isolation_middleware_success():
-    with patch("src.core.security.auth.verify_id_token") as mock_verify:
-        mock_verify.return_value = {"tenant_id": "tenant-123"}
-        response = client.get("/data", headers={"Authorization": "Bearer valid-token"})
-        assert response.status_code == 200
-        assert response.json()["tenant"] == "tenant-123"
+@pytest.fixture
+def tenant_a():
+    # Active tenant for the test; teardown resets it even when an assertion fails
+    token = current_tenant.set("tenant-A")
+    yield "tenant-A"
+    current_tenant.reset(token)
 
-def test_tenant_isolation_middleware_no_token():
-    response = client.get("/data")
-    assert response.status_code == 403
+@pytest.fixture
+def verify_token(monkeypatch):
+    # Stand-in for Firebase token verification; tests set return_value / side_effect
+    mock_verify = MagicMock()
+    monkeypatch.setattr("src.core.security.auth.verify_id_token", mock_verify)
+    return mock_verify
 
-def test_tenant_isolation_middleware_invalid_token():
-    with patch("src.core.security.auth.verify_id_token") as mock_verify:
-        mock_verify.side_effect = Exception("Invalid token")
-        response = client.get("/data", headers={"Authorization": "Bearer bad-token"})
-        assert response.status_code == 403
+@pytest.mark.parametrize("verify_effect,headers,expected_status,expected_tenant", [
+    ({"return_value": {"tenant_id": "tenant-123"}}, _AUTH_VALID, 200, "tenant-123"),
+    ({}, None, 403, None),
+    ({"side_effect": Exception("Invalid token")}, _AUTH_BAD, 403, None),
+], ids=["success", "no_token", "invalid_token"])
+def test_tenant_isolation_middleware(client, verify_token, verify_effect, headers, expected_status, expected_tenant):
+    for attr, value in verify_effect.items():
+        setattr(verify_token, attr, value)
+    response = client.get("/data", headers=headers or {})
+    assert response.status_code == expected_status
+    if expected_tenant is not None:
+        assert response.json()["tenant"] == expected_tenant
 
-def test_firestore_wrapper_valid_access():
-    token = current_tenant.set("tenant-A")
+def test_tenant_scoped_caches_verified_token(client, verify_token):
+    _TOKEN_CACHE.clear()
     try:
-        mock_real_client = MagicMock()
-        db = TenantFirestore(client=mock_real_client)
-        db.collection("tenants/tenant-A/users")
-        mock_real_client.collection.assert_called_with("tenants/tenant-A/users")
+        verify_token.return_value = {"tenant_id": "tenant-123", "exp": time.time() + 3600}
+        for _ in range(2):
+            response = client.get("/data", headers={"Authorization": "Bearer cached-token"})
+            assert response.json()["tenant"] == "tenant-123"
+        verify_token.assert_called_once_with("cached-token")
     finally:
-        current_tenant.reset(token)
+        _TOKEN_CACHE.clear()
 
-def test_firestore_wrapper_cross_tenant_access_hack():
-    token = current_tenant.set("tenant-A")
+def test_firestore_wrapper_valid_access(tenant_a):
+    mock_real_client = MagicMock()
+    db = TenantFirestore(client=mock_real_client)
+    db.collection("tenants/tenant-A/users")
+    mock_real_client.collection.assert_called_with("tenants/tenant-A/users")
+
+def test_firestore_wrapper_cross_tenant_access_hack(tenant_a):
+    mock_real_client = MagicMock()
+    db = TenantFirestore(client=mock_real_client)
+    with pytest.raises(SecurityBreachError):
+        db.collection("tenants/tenant-B/users")
+    with pytest.raises(SecurityBreachError):
+        db.collection("users")
+    # Segment-wise: a tenant id that merely starts with ours is another tenant
+    with pytest.raises(SecurityBreachError):
+        db.collection("tenants/tenant-A2/users")
+    with pytest.raises(SecurityBreachError):
+        db.collection("tenants/tenant-A/users/../../tenant-B/users")
+    mock_real_client.collection.return_value.path = "tenants/tenant-A/users"
+    with pytest.raises(SecurityBreachError):
+        db.collection("tenants/tenant-A/users").document("..")
+
+def test_shared_firestore_wrapper_validates_against_active_tenant():
+    # One TenantFirestore serves every tenant (app.state.db), so the prefix must follow current_tenant
+    mock_real_client = MagicMock()
+    db = TenantFirestore(client=mock_real_client)
+    for tenant_id, other_id in [("tenant-A", "tenant-B"), ("tenant-B", "tenant-A")]:
+        token = current_tenant.set(tenant_id)
+        try:
+            db.collection(f"tenants/{tenant_id}/users")
+            with pytest.raises(SecurityBreachError):
+                db.collection(f"tenants/{other_id}/users")
+        finally:
+            current_tenant.reset(token)
+
+def test_firestore_wrapper_child_revalidated_on_tenant_switch(tenant_a):
+    mock_real_client = MagicMock()
+    mock_real_client.collection.return_value.path = "tenants/tenant-A/jobs"
+    db = TenantFirestore(client=mock_real_client)
+    jobs = db.collection("tenants/tenant-A/jobs")
+
+    # Single segment under a parent validated for the active tenant
+    jobs.document("job-1")
+    mock_real_client.collection.return_value.document.assert_called_with("job-1")
+
+    # A ref validated for tenant-A must not be trusted under another tenant
+    inner = current_tenant.set("tenant-B")
     try:
-        mock_real_client = MagicMock()
-        db = TenantFirestore(client=mock_real_client)
-        with pytest.raises(SecurityBreachError):
-            db.collection("tenants/tenant-B/users")
         with pytest.raises(SecurityBreachError):
-            db.collection("users")
+            jobs.document("job-1")
     finally:
-        current_tenant.reset(token)
+        current_tenant.reset(inner)
 
-def test_firestore_wrapper_traversal_attack():
-    token = current_tenant.set("tenant-A")
-    try:
-        mock_real_client = MagicMock()
-        
-        # Setup mock hierarchy
-        # tenants/tenant-A/users/doc1
-        mock_doc_ref = MagicMock()
-        mock_doc_ref.path = "tenants/tenant-A/users/doc1"
-        
-        mock_col_ref = MagicMock()
-        mock_col_ref.path = "tenants/tenant-A/users"
-        mock_col_ref.document.return_value = mock_doc_ref
-        
-        mock_real_client.collection.return_value = mock_col_ref
-        
-        # Parent of doc is collection (safe)
-        mock_doc_ref.parent = mock_col_ref
-        
-        # Parent of collection is doc? No, parent of collection is doc or None (if root).
-        # Wait, firestore hierarchy: Collection -> Doc -> Collection -> Doc
-        # tenants/tenant-A (doc) -> users (col) -> doc1 (doc)
-        
-        mock_tenant_doc = MagicMock()
-        mock_tenant_doc.path = "tenants/tenant-A"
-        mock_col_ref.parent = mock_tenant_doc
-        
-        mock_root_col = MagicMock()
-        mock_root_col.path = "tenants"
-        mock_tenant_doc.parent = mock_root_col
-        
-        db = TenantFirestore(client=mock_real_client)
-        
-        # Get valid collection
-        col = db.collection("tenants/tenant-A/users")
-        
-        # Get valid doc
-        doc = col.document("doc1")
-        
-        # Access parent (collection) - Should be OK
-        parent_col = doc.parent
-        assert parent_col._ref.path == "tenants/tenant-A/users"
-        
-        # Access parent of collection (tenant doc) - Should be OK?
-        # tenants/tenant-A is the prefix.
-        parent_doc = parent_col.parent
-        assert parent_doc._ref.path == "tenants/tenant-A"
-        
-        # Access parent of tenant doc (tenants collection) - Should FAIL
-        # Path "tenants" does not start with "tenants/tenant-A/"
-        with pytest.raises(SecurityBreachError) as excinfo:
-            _ = parent_doc.parent
-        assert "Traversal attempt denied" in str(excinfo.value)
+def fake_ref(path, **kwargs):
+    # Plain attribute stub for refs whose calls are never asserted (cheaper than MagicMock)
+    return SimpleNamespace(path=path, **kwargs)
 
-    finally:
-        current_tenant.reset(token)
+class TenantTree(NamedTuple):
+    client: MagicMock
+    col_ref: SimpleNamespace
+    doc_ref: SimpleNamespace
+    tenant_doc: SimpleNamespace
+    root_col: SimpleNamespace
 
-def test_firestore_wrapper_add_check():
-    token = current_tenant.set("tenant-A")
-    try:
-        mock_real_client = MagicMock()
-        mock_col_ref = MagicMock()
-        mock_col_ref.path = "tenants/tenant-A/users"
-        mock_real_client.collection.return_value = mock_col_ref
-        
-        # Mock add behavior
-        mock_new_doc_ref = MagicMock()
-        mock_new_doc_ref.path = "tenants/tenant-A/users/new_id"
-        mock_col_ref.document.return_value = mock_new_doc_ref
-        
-        mock_new_doc_ref.create.return_value = "timestamp"
-        
-        db = TenantFirestore(client=mock_real_client)
-        col = db.collection("tenants/tenant-A/users")
-        
-        # Should succeed
-        col.add({"name": "test"})
-        
-        # Verify create was called
-        mock_new_doc_ref.create.assert_called()
+@pytest.fixture(scope="module")
+def _tenant_a_tree():
+    """
+    Mock hierarchy for tenants/tenant-A/users/doc1, wired once per module.
+    Firestore hierarchy: tenants (col) -> tenant-A (doc) -> users (col) -> doc1 (doc)
+    """
+    mock_real_client = MagicMock()
 
-    finally:
-        current_tenant.reset(token)
+    mock_root_col = fake_ref("tenants")
+    mock_tenant_doc = fake_ref("tenants/tenant-A", parent=mock_root_col)
+    mock_col_ref = fake_ref("tenants/tenant-A/users", parent=mock_tenant_doc)
+    # Parent of doc is collection (safe)
+    mock_doc_ref = fake_ref("tenants/tenant-A/users/doc1", parent=mock_col_ref)
+    mock_col_ref.document = lambda document_id=None: mock_doc_ref
 
-def test_batch_wrapper_usage():
-    token = current_tenant.set("tenant-A")
-    try:
-        mock_real_client = MagicMock()
-        mock_batch = MagicMock()
-        mock_real_client.batch.return_value = mock_batch
-        
-        db = TenantFirestore(client=mock_real_client)
-        batch = db.batch()
-        
-        # Mock refs
-        doc_ref = MagicMock()
-        doc_ref.path = "tenants/tenant-A/users/1"
-        
-        # Wrap doc ref? batch accepts unwrapped or wrapped? 
-        # Our batch wrapper unwraps if needed.
-        # If we pass a mock directly with path, it checks path.
-        
-        batch.set(doc_ref, {"a": 1})
-        mock_batch.set.assert_called()
-        
-        # Invalid ref
-        bad_ref = MagicMock()
-        bad_ref.path = "tenants/tenant-B/users/1"
-        del bad_ref._ref # Ensure it doesn't have _ref so validation happens on bad_ref
-        with pytest.raises(SecurityBreachError):
-            batch.set(bad_ref, {"a": 1})
+    mock_real_client.collection.return_value = mock_col_ref
 
-    finally:
-        current_tenant.reset(token)
-
-def test_endpoint_hack_attempt():
-    with patch("src.core.security.auth.verify_id_token") as mock_verify:
-        mock_verify.return_value = {"tenant_id": "tenant-A"}
-        
-        # valid
-        response = client.get("/db-test?path=tenants/tenant-A/data", headers={"Authorization": "Bearer token"})
-        assert response.status_code == 200
-        
-        # invalid (hack)
-        # Because we fixed security.py to propagate exceptions for logic (SecurityBreachError) 
-        # but catch auth errors.
-        # Wait, I updated security.py to catch verify_token exceptions, then set context, then call func.
-        # The SecurityBreachError happens in func.
-        # Func is called inside `try: ... finally: reset`.
-        # So SecurityBreachError propagates out of decorator.
-        # FastAPI default exception handler returns 500.
-        
-        try:
-            response = client.get("/db-test?path=tenants/tenant-B/data", headers={"Authorization": "Bearer token"})
-            assert response.status_code == 500
-        except SecurityBreachError:
-            pass # Depending on TestClient config
+    return TenantTree(mock_real_client, mock_col_ref, mock_doc_ref, mock_tenant_doc, mock_root_col)
+
+@pytest.fixture
+def tenant_a_tree(_tenant_a_tree):
+    # Clears recorded calls (and side effects) but keeps the return_value / path wiring
+    _tenant_a_tree.client.reset_mock(return_value=False, side_effect=True)
+    return _tenant_a_tree
+
+def test_firestore_wrapper_traversal_attack(tenant_a_tree, tenant_a):
+    db = TenantFirestore(client=tenant_a_tree.client)
+    
+    # Get valid collection
+    col = db.collection("tenants/tenant-A/users")
+    
+    # Get valid doc
+    doc = col.document("doc1")
+    
+    # Access parent (collection) - Should be OK
+    parent_col = doc.parent
+    assert parent_col._ref.path == "tenants/tenant-A/users"
+    
+    # Access parent of collection (tenant doc) - Should be OK?
+    # tenants/tenant-A is the prefix.
+    parent_doc = parent_col.parent
+    assert parent_doc._ref.path == "tenants/tenant-A"
+    
+    # Access parent of tenant doc (tenants collection) - Should FAIL
+    # Path "tenants" does not start with "tenants/tenant-A/"
+    with pytest.raises(SecurityBreachError) as excinfo:
+        _ = parent_doc.parent
+    assert "Traversal attempt denied" in str(excinfo.value)
+
+def test_firestore_wrapper_add_check(tenant_a):
+    mock_real_client = MagicMock()
+    
+    # Mock add behavior
+    mock_new_doc_ref = fake_ref("tenants/tenant-A/users/new_id", id="new_id", create=MagicMock(return_value="timestamp"))
+    mock_real_client.collection.return_value = fake_ref(
+        "tenants/tenant-A/users", document=lambda document_id=None: mock_new_doc_ref
+    )
+    
+    db = TenantFirestore(client=mock_real_client)
+    col = db.collection("tenants/tenant-A/users")
+    
+    # Should succeed
+    col.add({"name": "test"})
+    
+    # Verify create was called
+    mock_new_doc_ref.create.assert_called()
+
+def test_batch_wrapper_usage(tenant_a):
+    mock_real_client = MagicMock()
+    mock_batch = MagicMock()
+    mock_real_client.batch.return_value = mock_batch
+    
+    db = TenantFirestore(client=mock_real_client)
+    batch = db.batch()
+    
+    # Mock refs
+    doc_ref = MagicMock()
+    doc_ref.path = "tenants/tenant-A/users/1"
+    
+    # Wrap doc ref? batch accepts unwrapped or wrapped? 
+    # Our batch wrapper unwraps if needed.
+    # If we pass a mock directly with path, it checks path.
+    
+    batch.set(doc_ref, {"a": 1})
+    mock_batch.set.assert_called()
+    
+    # Invalid ref
+    bad_ref = MagicMock()
+    bad_ref.path = "tenants/tenant-B/users/1"
+    del bad_ref._ref # Ensure it doesn't have _ref so validation happens on bad_ref
+    with pytest.raises(SecurityBreachError):
+        batch.set(bad_ref, {"a": 1})
+
+def test_batch_wrapper_rejects_unvalidatable_ref(tenant_a):
+    mock_real_client = MagicMock()
+    db = TenantFirestore(client=mock_real_client)
+    batch = db.batch()
+
+    # Wrapped refs are unwrapped before reaching the real batch
+    mock_real_client.document.return_value.path = "tenants/tenant-A/users/1"
+    batch.delete(db.document("tenants/tenant-A/users/1"))
+    mock_real_client.batch.return_value.delete.assert_called_with(mock_real_client.document.return_value, option=None)
+
+    with pytest.raises(SecurityBreachError):
+        batch.update(object(), {"a": 1})
+    mock_real_client.batch.return_value.update.assert_not_called()
+
+def test_async_firestore_wrapper_add_check(tenant_a):
+    mock_real_client = MagicMock()
+    
+    mock_new_doc_ref = fake_ref("tenants/tenant-A/users/new_id", id="new_id", create=AsyncMock(return_value="timestamp"))
+    mock_real_client.collection.return_value = fake_ref(
+        "tenants/tenant-A/users", document=lambda document_id=None: mock_new_doc_ref
+    )
+    
+    db = AsyncTenantFirestore(client=mock_real_client)
+    col = db.collection("tenants/tenant-A/users")
+    
+    ts, doc = asyncio.run(col.add({"name": "test"}))
+    assert ts == "timestamp"
+    assert isinstance(doc, AsyncTenantDocumentReference)
+    mock_new_doc_ref.create.assert_awaited()
+    
+    with pytest.raises(SecurityBreachError):
+        db.collection("tenants/tenant-B/users")
+
+def test_firestore_wrapper_with_sdk_refs(tenant_a):
+    # Real SDK refs: CollectionReference has no `.path`, so mocks alone don't cover this
+    db = TenantFirestore(client=firestore_v1.Client(project="p", credentials=AnonymousCredentials()))
+    jobs = db.collection("tenants/tenant-A/jobs")
+
+    assert jobs.path == "tenants/tenant-A/jobs"
+    assert jobs.document("job-1").path == "tenants/tenant-A/jobs/job-1"
+    assert jobs.document().path.startswith("tenants/tenant-A/jobs/")
+    assert jobs.document("job-1").collection("runs").path == "tenants/tenant-A/jobs/job-1/runs"
+    assert jobs.document("job-1").parent.path == "tenants/tenant-A/jobs"
+    with patch.object(firestore_v1.DocumentReference, "create", return_value="timestamp"):
+        ts, doc = jobs.add({"name": "test"})
+    assert ts == "timestamp" and doc.path.startswith("tenants/tenant-A/jobs/")
+
+    # Wrappers without a validated tenant take the slow path, which builds the child path
+    unvalidated = TenantCollectionReference(jobs._ref)
+    assert unvalidated.document().path.startswith("tenants/tenant-A/jobs/")
+    with pytest.raises(SecurityBreachError):
+        unvalidated.document("../../tenant-B/jobs/job-1")
+
+def test_async_firestore_wrapper_with_sdk_refs(tenant_a):
+    db = AsyncTenantFirestore(client=firestore_v1.AsyncClient(project="p", credentials=AnonymousCredentials()))
+    jobs = db.collection("tenants/tenant-A/jobs")
+
+    assert jobs.document().path.startswith("tenants/tenant-A/jobs/")
+    with patch.object(firestore_v1.AsyncDocumentReference, "create", AsyncMock(return_value="timestamp")):
+        ts, doc = asyncio.run(jobs.add({"name": "test"}, document_id="job-1"))
+    assert ts == "timestamp" and doc.path == "tenants/tenant-A/jobs/job-1"
+
+def test_async_document_writes_with_sdk_refs(tenant_a):
+    sdk_client = firestore_v1.AsyncClient(project="p", credentials=AnonymousCredentials())
+    # Stub only the Commit RPC so the real AsyncDocumentReference methods run
+    sdk_client._firestore_api_internal = MagicMock(
+        commit=AsyncMock(return_value=firestore.CommitResponse(write_results=[write.WriteResult()]))
+    )
+    job = AsyncTenantFirestore(client=sdk_client).document("tenants/tenant-A/jobs/job-1")
+
+    async def write_job():
+        await job.set({"status": "QUEUED"})
+        await job.update({"status": "COMPLETED"})
+        await job.delete()
+    asyncio.run(write_job())
+
+    commit = sdk_client._firestore_api_internal.commit
+    assert commit.await_count == 3
+    # The SDK's default retry policy is kept rather than overridden
+    assert "retry" not in commit.await_args.kwargs
+
+def test_endpoint_hack_attempt(client, verify_token):
+    verify_token.return_value = {"tenant_id": "tenant-A"}
+    
+    # valid
+    response = client.get("/db-test?path=tenants/tenant-A/data", headers=_AUTH_GENERIC)
+    assert response.status_code == 200
+    
+    # invalid (hack)
+    # Because we fixed security.py to propagate exceptions for logic (SecurityBreachError) 
+    # but catch auth errors.
+    # Wait, I updated security.py to catch verify_token exceptions, then set context, then call func.
+    # The SecurityBreachError happens in func.
+    # Func is called inside `try: ... finally: reset`.
+    # So SecurityBreachError propagates out of decorator.
+    # FastAPI default exception handler returns 500.
+    
+    try:
+        response = client.get("/db-test?path=tenants/tenant-B/data", headers=_AUTH_GENERIC)
+        assert response.status_code == 500
+    except SecurityBreachError:
+        pass # Depending on TestClient config
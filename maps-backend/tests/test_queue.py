@@ -0,0 +1,57 @@
+import asyncio
+import gzip
+import orjson
+import pytest
+from unittest.mock import MagicMock, patch
+from src.core.queue import JobQueue, _GZIP_MIN_BYTES
+from src.worker.handler import _read_task_body, _PAYLOAD_DECODER, _MAX_PAYLOAD_BYTES
+
+@pytest.fixture
+def queue():
+    with patch("src.core.queue.tasks_v2.CloudTasksClient"):
+        yield JobQueue(project_id="test-project", location="europe-west2")
+
+def _created_request(queue):
+    return queue.client.create_task.call_args.kwargs["request"]["task"]["http_request"]
+
+def test_enqueue_job_sends_small_bodies_uncompressed(queue):
+    queue.enqueue_job(job_id="job-1", tenant_id="tenant-a", payload={"contract_text": "short"})
+    http_request = _created_request(queue)
+    assert "Content-Encoding" not in http_request["headers"]
+    assert orjson.loads(http_request["body"])["data"] == {"contract_text": "short"}
+
+def test_enqueue_job_gzips_large_bodies(queue):
+    text = "x" * _GZIP_MIN_BYTES
+    queue.enqueue_job(job_id="job-1", tenant_id="tenant-a", payload={"contract_text": text})
+    http_request = _created_request(queue)
+    assert http_request["headers"]["Content-Encoding"] == "gzip"
+    assert len(http_request["body"]) < _GZIP_MIN_BYTES
+
+    # The worker decodes what the queue produced
+    body = _read_task_body(http_request["body"], http_request["headers"]["Content-Encoding"])
+    payload = _PAYLOAD_DECODER.decode(body)
+    assert (payload.job_id, payload.tenant_id, payload.data) == ("job-1", "tenant-a", {"contract_text": text})
+
+def test_read_task_body_rejects_oversized_payload():
+    with pytest.raises(ValueError):
+        _read_task_body(gzip.compress(b"0" * (_MAX_PAYLOAD_BYTES + 1)), "gzip")
+
+def test_read_task_body_rejects_truncated_payload():
+    with pytest.raises(ValueError):
+        _read_task_body(gzip.compress(b'{"a":1}')[:-8], "gzip")
+
+def test_enqueue_many_reports_partial_failures(queue):
+    def create_task(request):
+        if b"job-2" in request["task"]["http_request"]["body"]:
+            raise RuntimeError("Cloud Tasks unavailable")
+        return MagicMock()
+    queue.client.create_task.side_effect = create_task
+
+    jobs = [{"job_id": f"job-{i}", "tenant_id": "tenant-a", "payload": {}} for i in range(3)]
+    assert asyncio.run(queue.enqueue_many(jobs)) == ["job-2"]
+    assert queue.client.create_task.call_count == 3
+
+def test_enqueue_many_fails_all_without_client(queue):
+    queue.client = None
+    jobs = [{"job_id": f"job-{i}", "tenant_id": "tenant-a", "payload": {}} for i in range(2)]
+    assert asyncio.run(queue.enqueue_many(jobs)) == ["job-0", "job-1"]
@@ -0,0 +1,25 @@
+import pytest
+from unittest.mock import MagicMock
+from src.core.storage import ContractStore
+
+@pytest.fixture
+def store():
+    return ContractStore("contracts", client=MagicMock())
+
+def test_upload_returns_tenant_scoped_uri(store):
+    assert store.upload("tenant-a", "job-1", "text") == "gs://contracts/tenants/tenant-a/jobs/job-1.txt"
+    store.bucket.blob.assert_called_once_with("tenants/tenant-a/jobs/job-1.txt")
+
+def test_download_reads_own_tenant_blob(store):
+    store.bucket.blob.return_value.download_as_text.return_value = "text"
+    assert store.download("gs://contracts/tenants/tenant-a/jobs/job-1.txt", "tenant-a") == "text"
+
+@pytest.mark.parametrize("uri", [
+    "gs://contracts/tenants/other/jobs/job-1.txt",
+    "gs://contracts/tenants/tenant-a/../other/jobs/job-1.txt",
+    "gs://other-bucket/tenants/tenant-a/jobs/job-1.txt",
+])
+def test_download_rejects_uri_outside_tenant(store, uri):
+    with pytest.raises(ValueError):
+        store.download(uri, "tenant-a")
+    store.bucket.blob.assert_not_called()